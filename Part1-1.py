@@ -1,10 +1,13 @@
 import tkinter as tk
 import numpy as np
-import random
+
+from gridworld import GridWorldEngine, GridWorldEnv, part1_model
+from gridworld.viewer import GridRenderer
 
 class GridWorld:
-    def __init__(self, master):
+    def __init__(self, master, max_fps=30, profile=False):
         self.master = master
+        self.profile = profile  # True times the solver phases and the redraws (engine.profile)
         self.master.title("GridWorld")
 
         self.grid_size = 5
@@ -13,6 +16,7 @@ class GridWorld:
         canvas_height = self.grid_size * self.cell_size + 50
         self.canvas = tk.Canvas(master, width=self.grid_size * self.cell_size, height=canvas_height)
         self.canvas.pack()
+        self.renderer = GridRenderer(self.canvas, self.grid_size, self.cell_size, max_fps=max_fps)
 
         self.rewards = np.zeros((self.grid_size, self.grid_size))
         self.transitions = {}
@@ -25,6 +29,9 @@ class GridWorld:
 
         self.actions = ['up', 'down', 'left', 'right']  # Equal probabilities for every action
         self.action_probs = {'up': 0.25, 'down': 0.25, 'left': 0.25, 'right': 0.25}
+        self.engine = GridWorldEngine(GridWorldEnv(part1_model()), profile=self.profile)  # Headless solvers
+        self.engine.subscribe(self.show_progress)
+        self.renderer.profiler = self.engine.profiler
 
         self.values = np.zeros((self.grid_size, self.grid_size))  # Value function, initializing all values of states to be 0
 
@@ -50,121 +57,36 @@ class GridWorld:
             (3, 2): "red",
             (4, 4): "yellow"
         }
-
-        for i in range(self.grid_size):
-            for j in range(self.grid_size):
-                x0 = j * self.cell_size
-                y0 = i * self.cell_size
-                x1 = x0 + self.cell_size
-                y1 = y0 + self.cell_size
-                color = self.colors.get((i, j), "white")
-                self.canvas.create_rectangle(x0, y0, x1, y1, fill=color, outline="black")
-                self.canvas.create_text(x0 + self.cell_size / 2, y0 + self.cell_size / 2, text=f"{self.values[i, j]:.2f}", tags="values")
+        self.renderer.set_colors(self.colors)
 
     def update_values(self):
-        self.canvas.delete("values")
-        for i in range(self.grid_size):
-            for j in range(self.grid_size):
-                x0 = j * self.cell_size
-                y0 = i * self.cell_size
-                self.canvas.create_text(x0 + self.cell_size / 2, y0 + self.cell_size / 2, text=f"{self.values[i, j]:.2f}", tags="values")
+        self.renderer.draw_values(self.values)
 
     def update_policy_display(self, policy):
-        self.canvas.delete("policy")
-        for i in range(self.grid_size):
-            for j in range(self.grid_size):
-                x0 = j * self.cell_size
-                y0 = i * self.cell_size
-                action = policy[i, j]
-                if action:
-                    self.canvas.create_text(x0 + self.cell_size / 2, y0 + self.cell_size - 20, text=action, tags="policy", fill="black")
-
-    def get_next_state(self, i, j, action):
-        ni, nj = i, j
-        if action == 'up':
-            ni -= 1
-        elif action == 'down':
-            ni += 1
-        elif action == 'left':
-            nj -= 1
-        elif action == 'right':
-            nj += 1
-
-        # Agent moving outside grid
-        if (i, j) == (0, 1):
-            return 3, 2, 5.0  # Special state
-        elif (i, j) == (0, 4):
-            if np.random.rand() < 0.5:
-                return 3, 2, 2.5
-            else:
-                return 4, 4, 2.5
-        elif ni < 0 or ni >= self.grid_size or nj < 0 or nj >= self.grid_size:
-            return i, j, -0.5  # Stay in the same position, negative reward
-        else:
-            return ni, nj, 0.0  # Normal state, zero reward
+        self.renderer.draw_policy(policy)
 
-    def Bellman_Equation(self, gamma=0.95, epsilon=0.01):
-        print("Running Bellman Equation")
-        while True:
-            new_values = np.zeros((self.grid_size, self.grid_size))
-            for i in range(self.grid_size):
-                for j in range(self.grid_size):
-                    for action in self.actions:
-                        ni, nj, reward = self.get_next_state(i, j, action)
-                        new_values[i, j] += self.action_probs[action] * (reward + gamma * self.values[ni, nj])
-
-            if np.sum(np.abs(new_values - self.values)) < epsilon:
-                break
-            self.values = new_values
-            self.update_values()
+    def show_progress(self, event, engine):
+        self.values = engine.values
+        # Redraws are capped by the renderer's frame rate
+        if self.renderer.render(values=self.values, force=event == 'done'):
             self.master.update()
 
+    def Bellman_Equation(self, gamma=0.95, epsilon=0.01):
+        print("Running Bellman Equation")
+        probs = [self.action_probs[a] for a in self.actions]
+        self.engine.Policy_Evaluation(probs, gamma, epsilon, norm='sum')
         self.display_highest_value_states()
 
     def Iterative_Policy_Evaluation(self, gamma=0.95, epsilon=0.01):
         print("Running Iterative Policy Evaluation")
-        while True:
-            new_values = np.zeros((self.grid_size, self.grid_size))
-            for i in range(self.grid_size):
-                for j in range(self.grid_size):
-                    for action in self.actions:
-                        ni, nj, reward = self.get_next_state(i, j, action)
-                        new_values[i, j] += self.action_probs[action] * (reward + gamma * self.values[ni, nj])
-
-            delta_matrix = np.abs(self.values - new_values)
-            delta = np.max(delta_matrix)
-            if delta < epsilon:
-                break
-            self.values = new_values
-            self.update_values()
-            self.master.update()
-
+        probs = [self.action_probs[a] for a in self.actions]
+        self.engine.Policy_Evaluation(probs, gamma, epsilon, norm='max')
         self.display_highest_value_states()
 
     def Value_Iteration(self, gamma=0.95, epsilon=0.01):
         print("Running Value Iteration")
-        policy = np.full((self.grid_size, self.grid_size), "", dtype=object)
-        while True:
-            new_values = np.zeros((self.grid_size, self.grid_size))
-            for i in range(self.grid_size):
-                for j in range(self.grid_size):
-                    action_values = []
-                    for action in self.actions:
-                        ni, nj, reward = self.get_next_state(i, j, action)
-                        action_values.append(reward + gamma * self.values[ni, nj])
-                    # new_values[i, j] = max(action_values)
-                    max_value = max(action_values)
-                    new_values[i, j] = max_value
-                    best_actions = [self.actions[k] for k, v in enumerate(action_values) if v == max_value]
-                    policy[i, j] = best_actions        
-
-            if np.sum(np.abs(new_values - self.values)) < epsilon:
-                break
-            self.values = new_values
-            self.update_values()
-            self.master.update()
-
-        # self.update_policy_display(policy)
+        self.engine.Value_Iteration(gamma, epsilon, norm='sum')
+        # self.update_policy_display(self.engine.policy)
         self.display_highest_value_states()
 
     def start_evaluation(self):
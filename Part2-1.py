@@ -1,10 +1,13 @@
 import tkinter as tk
 import numpy as np
-import random
+
+from gridworld import GridWorldEngine, GridWorldEnv, part2_model
+from gridworld.viewer import GridRenderer
 
 class GridWorld:
-    def __init__(self, master):
+    def __init__(self, master, max_fps=30, profile=False):
         self.master = master
+        self.profile = profile  # True times the solver phases and the redraws (engine.profile)
         self.master.title("GridWorld")
 
         self.grid_size = 5
@@ -13,6 +16,8 @@ class GridWorld:
         canvas_height = self.grid_size * self.cell_size + 50
         self.canvas = tk.Canvas(master, width=self.grid_size * self.cell_size, height=canvas_height)
         self.canvas.pack()
+        self.renderer = GridRenderer(self.canvas, self.grid_size, self.cell_size, max_fps=max_fps,
+                                     show_values=False, policy_style='glyph')
 
         self.rewards = np.zeros((self.grid_size, self.grid_size))
         self.transitions = {}
@@ -26,8 +31,11 @@ class GridWorld:
         self.actions = ['U', 'D', 'L', 'R']  # Up, Down, Left, Right
         self.action_probs = {'U': 0.25, 'D': 0.25, 'L': 0.25, 'R': 0.25}
 
-        self.values = np.zeros((self.grid_size, self.grid_size))  # Value function, initializing all values of states to be 0
-        self.policy = np.full((self.grid_size, self.grid_size), ' ')  # Policy array
+        self.engine = GridWorldEngine(GridWorldEnv(part2_model()), profile=self.profile)  # Headless solvers
+        self.engine.subscribe(self.show_progress)
+        self.renderer.profiler = self.engine.profiler
+        self.values = self.engine.values  # Value function, initializing all values of states to be 0
+        self.policy = self.engine.policy  # Policy array
 
         self.highest_value_label = tk.Label(self.master, text="")
         self.highest_value_label.pack()
@@ -60,112 +68,23 @@ class GridWorld:
             (4, 0): "black",
         }
 
-        for i in range(self.grid_size):
-            for j in range(self.grid_size):
-                x0 = j * self.cell_size
-                y0 = i * self.cell_size
-                x1 = x0 + self.cell_size
-                y1 = y0 + self.cell_size
-                color = self.colors.get((i, j), "white")
-                self.canvas.create_rectangle(x0, y0, x1, y1, fill=color, outline="black")
+        self.renderer.set_colors(self.colors)
 
     def update_policy_display(self):
-        self.canvas.delete("policy")
-        for i in range(self.grid_size):
-            for j in range(self.grid_size):
-                x0 = j * self.cell_size
-                y0 = i * self.cell_size
-                action = self.policy[i, j]
-                if action == 'U':
-                    arrow = '↑'
-                elif action == 'D':
-                    arrow = '↓'
-                elif action == 'L':
-                    arrow = '←'
-                elif action == 'R':
-                    arrow = '→'
-                else:
-                    arrow = ' '
-                self.canvas.create_text(x0 + self.cell_size / 2, y0 + self.cell_size / 2,
-                                        text=arrow, tags="policy", fill="black", font=("Helvetica", 24))
-
-    def get_next_state(self, i, j, action):
-        ni, nj = i, j
-        if action == 'U':
-            ni -= 1
-        elif action == 'D':
-            ni += 1
-        elif action == 'L':
-            nj -= 1
-        elif action == 'R':
-            nj += 1
-
-        if (i, j) == (0, 1):
-            return 3, 2, 5.0  # Special state
-        elif (i, j) == (0, 4):
-            # Move to (4, 2) or (4, 4) with equal probability
-            if np.random.rand() < 0.5:
-                return 4, 2, 2.5
-            else:
-                return 4, 4, 2.5
-        elif ni < 0 or ni >= self.grid_size or nj < 0 or nj >= self.grid_size:
-            return i, j, -0.5  # Stay in the same position, negative reward
-        elif (ni, nj) == (2, 4) or (ni, nj) == (4, 0):
-            return ni, nj, 0.0  # Terminal states
-        else:
-            return ni, nj, -0.2  # Normal state, -0.2 reward
-
-    def generate_episode(self, exploring_starts=True):
-        episode = []
-        if exploring_starts:
-            state = (random.randint(0, self.grid_size - 1), random.randint(0, self.grid_size - 1))
-        else:
-            state = (0, 0)  # Start from a fixed initial state
-
-        while state not in [(2, 4), (4, 0)]:
-            action = random.choices(self.actions, weights=[self.action_probs[a] for a in self.actions])[0]
-            ni, nj, reward = self.get_next_state(*state, action)
-            episode.append((state, action, reward))
-            state = (ni, nj)
-
-        return episode
-
-    def update_policy(self, returns, N, epsilon=0.1):
-        for state in returns:
-            max_return = max(returns[state].values())
-            best_action = random.choice([action for action, value in returns[state].items() if value == max_return])
-            for action in self.actions:
-                if action == best_action:
-                    self.action_probs[action] = 1 - epsilon + (epsilon / len(self.actions))
-                else:
-                    self.action_probs[action] = epsilon / len(self.actions)
-            self.policy[state] = best_action  # Update the policy for this state
+        self.renderer.draw_policy(self.policy)
 
-    def Monte_Carlo(self, exploring_starts=True, gamma=0.95, epsilon=0.1):
-        print("Running Monte Carlo" + (" with Exploring Starts" if exploring_starts else " without Exploring Starts"))
-        returns = {}
-        N = {}
-
-        for i in range(self.grid_size):
-            for j in range(self.grid_size):
-                returns[(i, j)] = {action: 0 for action in self.actions}
-                N[(i, j)] = {action: 0 for action in self.actions}
-
-        for _ in range(10000):  # Number of episodes
-            episode = self.generate_episode(exploring_starts)
-            G = 0
-            for t in reversed(range(len(episode))):
-                state, action, reward = episode[t]
-                G = gamma * G + reward
-                if (state, action) not in [(x[0], x[1]) for x in episode[:t]]:
-                    N[state][action] += 1
-                    returns[state][action] += (G - returns[state][action]) / N[state][action]
-                    self.values[state] += (G - self.values[state]) / N[state][action]
-
-            self.update_policy(returns, N, epsilon)
-            self.update_policy_display()
+    def show_progress(self, event, engine):
+        self.values = engine.values
+        self.policy = engine.policy
+        # Redraws are capped by the renderer's frame rate
+        if self.renderer.render(policy=self.policy, force=event == 'done'):
             self.master.update()
 
+    def Monte_Carlo(self, exploring_starts=True, gamma=0.95, epsilon=0.1):
+        print("Running Monte Carlo" + (" with Exploring Starts" if exploring_starts else " without Exploring Starts"))
+        self.engine.Monte_Carlo(exploring_starts, gamma, epsilon)
+        print(f"Stopped by {self.engine.stop_reason} after {self.engine.episodes_run} episodes")
+        print(f"Seed: {self.engine.run_seed}")  # Pass as seed= to replay the run
         self.display_optimal_policy()
 
     def start_evaluation(self):
@@ -177,9 +96,10 @@ class GridWorld:
             self.Monte_Carlo(exploring_starts=False)
 
     def reset_values(self):
-        self.values = np.zeros((self.grid_size, self.grid_size))  # Reset values
-        self.policy = np.full((self.grid_size, self.grid_size), ' ')  # Reset policy
-        self.canvas.delete("policy")
+        self.engine.reset()
+        self.values = self.engine.values  # Reset values
+        self.policy = self.engine.policy  # Reset policy
+        self.renderer.clear_policy()
         self.highest_value_label.config(text="")
         self.policy_label.config(text="")
         self.update_policy_display()
@@ -0,0 +1,9 @@
+from gridworld.model import ACTIONS, GridModel, part1_model, part2_model
+from gridworld.env import GridWorldEnv, SwappingGridWorldEnv
+from gridworld.engine import GridWorldEngine
+from gridworld.layout import load_layout, parse_layout
+from gridworld.stopping import StoppingCriteria
+from gridworld.checkpoint import Checkpointer
+from gridworld.policy import Policy
+from gridworld.batch import configurations, solve_batch
+from gridworld.store import ResultStore
@@ -0,0 +1,210 @@
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+
+import numpy as np
+
+from gridworld.policy import Policy
+
+# Headless batch solving of many problems in one call, e.g. a sweep over
+# layouts and hyperparameters:
+#
+#   models = [part2_model(blue_pos=(0, j)) for j in range(4)]
+#   results = solve_batch(*configurations(models, gammas=[0.9, 0.95, 0.99]))
+#   results.table['sweeps'], results.values[k], results.policies[k]
+#
+# Problems with the same grid shape are stacked along a leading batch axis
+# and solved together by synchronous sweeps, one vectorized backup of the
+# whole stack per sweep; a problem stops sweeping once its own residual
+# test passes (the same test as dp.solve with schedule='sync', so the
+# values match a one-at-a-time solve). Different shapes, or stacks larger
+# than max_states, become separate work units, run in a process pool when
+# n_workers is given.
+
+METHODS = ('value_iteration', 'policy_evaluation')
+
+TABLE_DTYPE = np.dtype([
+    ('problem', np.int64), ('model', np.int64), ('rows', np.int64), ('cols', np.int64),
+    ('gamma', float), ('epsilon', float), ('sweeps', np.int64), ('backups', np.int64),
+    ('converged', bool), ('start_value', float), ('max_value', float), ('mean_value', float),
+])
+
+
+def configurations(models, gammas=(0.95,), epsilons=(0.01,)):
+    # Cartesian product of layouts and hyperparameters, as the (models,
+    # model ids, gammas, epsilons) arguments of solve_batch; every model is
+    # listed once however many configurations share it
+    rows = list(itertools.product(range(len(models)), gammas, epsilons))
+    model_ids, gamma, epsilon = (np.array(column) for column in zip(*rows))
+    return list(models), model_ids, gamma, epsilon
+
+
+class BatchStack:
+    # Successor tables of same-shaped models stacked along a leading axis.
+    # Tables with fewer successors per (state, action) are padded with
+    # zero-probability self transitions, so the stack has one width K.
+    def __init__(self, models):
+        shapes = {model.shape for model in models}
+        if len(shapes) != 1:
+            raise ValueError(f"Stacked models must share one grid shape, got {sorted(shapes)}")
+        self.shape = shapes.pop()
+        S, A = models[0].n_states, models[0].n_actions
+        K = max(model.next_states.shape[2] for model in models)
+        self.next_states = np.broadcast_to(np.arange(S)[None, :, None, None], (len(models), S, A, K)).copy()
+        self.next_probs = np.zeros((len(models), S, A, K))
+        for m, model in enumerate(models):
+            k = model.next_states.shape[2]
+            self.next_states[m, :, :, :k] = model.next_states
+            self.next_probs[m, :, :, :k] = model.next_probs
+        self.R = np.stack([model.R for model in models])
+
+
+def solve_stack(models, model_ids, gamma, epsilon, method='value_iteration', action_probs=None, norm='max',
+                max_sweeps=None):
+    # Solves B problems over same-shaped models at once: problem b runs on
+    # models[model_ids[b]] with gamma[b] and epsilon[b]. The successor
+    # indices are flattened into the (B * S,) value vector once, up front;
+    # converged problems are dropped from the stack as they finish. Returns
+    # values (B, S), Q (B, S, A), sweeps (B,), converged (B,) and the
+    # residual of every sweep, (B, max sweeps) padded with NaN.
+    stack = BatchStack(models)
+    model_ids = np.asarray(model_ids, dtype=np.int64)
+    B, (_, S, A, _) = len(model_ids), stack.next_states.shape
+    gamma = np.broadcast_to(np.asarray(gamma, dtype=float), (B,))
+    epsilon = np.broadcast_to(np.asarray(epsilon, dtype=float), (B,))
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method!r}")
+    pi = None
+    if method == 'policy_evaluation':
+        probs = np.full(A, 1.0 / A) if action_probs is None else np.asarray(action_probs, dtype=float)
+        pi = np.broadcast_to(probs, (S, A))
+
+    V = np.zeros((B, S))
+    V_flat = V.reshape(-1)
+    sweeps = np.zeros(B, dtype=np.int64)
+    converged = np.zeros(B, dtype=bool)
+    history = []  # (active problems, their residuals) per sweep
+
+    # Per active problem: flat successor ids into V, their probabilities,
+    # rewards and parameters. The short successor and action axes go first
+    # (K, B, A, S), so reducing over them adds or compares whole contiguous
+    # slices instead of reducing length-2 and length-4 rows.
+    active = np.arange(B)
+    flat = np.ascontiguousarray(stack.next_states[model_ids].transpose(3, 0, 2, 1)) + (active * S)[:, None, None]
+    probs = np.ascontiguousarray(stack.next_probs[model_ids].transpose(3, 0, 2, 1))
+    R = np.ascontiguousarray(stack.R[model_ids].transpose(0, 2, 1))
+    pi = None if pi is None else np.ascontiguousarray(pi.T)
+    g, eps = gamma[:, None, None], epsilon
+    sweep = 0
+    while active.size and (max_sweeps is None or sweep < max_sweeps):
+        q = R + g * (probs * V_flat[flat]).sum(axis=0)
+        new_V = q.max(axis=1) if pi is None else (pi * q).sum(axis=1)
+        sweep += 1
+        sweeps[active] = sweep
+        diff = np.abs(new_V - V[active])
+        residuals = diff.sum(axis=1) if norm == 'sum' else diff.max(axis=1)
+        history.append((active, residuals))
+        done = residuals < eps
+
+        # Like dp.solve, a converged problem keeps the values it had before
+        # the final backup
+        running = ~done
+        V[active[running]] = new_V[running]
+        if done.any():
+            converged[active[done]] = True
+            active = active[running]
+            flat, probs = flat[:, running], probs[:, running]
+            R, g, eps = R[running], g[running], eps[running]
+
+    expected = (stack.next_probs[model_ids] * V[np.arange(B)[:, None, None, None], stack.next_states[model_ids]])
+    Q = stack.R[model_ids] + gamma[:, None, None] * expected.sum(axis=-1)
+    curves = np.full((B, len(history)), np.nan)
+    for k, (problems, residuals) in enumerate(history):
+        curves[problems, k] = residuals
+    return V, Q, sweeps, converged, curves
+
+
+def work_units(models, model_ids, max_states):
+    # Groups the problems by grid shape and splits each group into chunks of
+    # at most max_states stacked states; yields (problem ids, model ids used)
+    shapes = [models[m].shape for m in model_ids]
+    for shape in sorted(set(shapes)):
+        problems = np.array([b for b, s in enumerate(shapes) if s == shape], dtype=np.int64)
+        per_chunk = max(1, max_states // (shape[0] * shape[1]))
+        for start in range(0, len(problems), per_chunk):
+            chunk = problems[start:start + per_chunk]
+            yield chunk, np.unique(model_ids[chunk])
+
+
+class BatchResults:
+    # Output of solve_batch: a compact per-problem table (a structured array,
+    # see TABLE_DTYPE) plus each problem's value grid, Q table, greedy policy
+    # and convergence curve ((sweeps, 2) rows of sweep, residual), in
+    # problem order
+    def __init__(self, table, values, q, policies, curves):
+        self.table = table
+        self.values = values
+        self.q = q
+        self.policies = policies
+        self.curves = curves
+
+    def __len__(self):
+        return len(self.table)
+
+    def format_table(self, columns=('problem', 'model', 'rows', 'cols', 'gamma', 'epsilon', 'sweeps',
+                                    'converged', 'start_value')):
+        # Plain-text table for printing
+        lines = [' '.join(f"{name:>11}" for name in columns)]
+        for row in self.table:
+            cells = []
+            for name in columns:
+                value = row[name]
+                cells.append(f"{value:>11.4g}" if self.table.dtype[name].kind == 'f' else f"{value!s:>11}")
+            lines.append(' '.join(cells))
+        return '\n'.join(lines)
+
+
+def solve_batch(models, model_ids=None, gammas=0.95, epsilons=0.01, method='value_iteration', action_probs=None,
+                norm='max', max_sweeps=None, n_workers=None, max_states=2 ** 18):
+    # Solves problem b = (models[model_ids[b]], gammas[b], epsilons[b]) for
+    # every b; by default one problem per model. gammas and epsilons are
+    # scalars or per-problem sequences (see configurations for grids).
+    # method: 'value_iteration', or 'policy_evaluation' of action_probs ((A,)
+    # or (S, A), the equiprobable policy by default; epsilon plays the role
+    # of theta). max_sweeps caps every problem, which is then reported as
+    # not converged. n_workers > 1 runs the work units in a process pool.
+    models = list(models)
+    model_ids = np.arange(len(models)) if model_ids is None else np.asarray(model_ids, dtype=np.int64)
+    B = len(model_ids)
+    gammas = np.broadcast_to(np.asarray(gammas, dtype=float), (B,))
+    epsilons = np.broadcast_to(np.asarray(epsilons, dtype=float), (B,))
+
+    units = list(work_units(models, model_ids, max_states))
+    args = [([models[m] for m in used], np.searchsorted(used, model_ids[problems]), gammas[problems],
+             epsilons[problems], method, action_probs, norm, max_sweeps) for problems, used in units]
+    if n_workers is not None and n_workers > 1 and len(units) > 1:
+        with ProcessPoolExecutor(min(n_workers, len(units))) as executor:
+            outputs = list(executor.map(solve_stack, *zip(*args)))
+    else:
+        outputs = [solve_stack(*unit_args) for unit_args in args]
+
+    table = np.zeros(B, dtype=TABLE_DTYPE)
+    table['problem'] = np.arange(B)
+    table['model'] = model_ids
+    table['gamma'] = gammas
+    table['epsilon'] = epsilons
+    values, q, policies, curves = [None] * B, [None] * B, [None] * B, [None] * B
+    for (problems, _), (V, Q, sweeps, converged, residuals) in zip(units, outputs):
+        for k, b in enumerate(problems.tolist()):
+            model = models[model_ids[b]]
+            values[b] = V[k].reshape(model.shape)
+            q[b] = Q[k]
+            policies[b] = Policy.from_q(Q[k], model.shape, model.is_terminal)
+            curves[b] = np.column_stack((np.arange(1, sweeps[k] + 1), residuals[k, :sweeps[k]]))
+            table['rows'][b], table['cols'][b] = model.shape
+            table['start_value'][b] = V[k, model.start_states[0]] if len(model.start_states) else np.nan
+        table['sweeps'][problems] = sweeps
+        table['backups'][problems] = sweeps * V.shape[1] * Q.shape[2]
+        table['converged'][problems] = converged
+        table['max_value'][problems] = V.max(axis=1)
+        table['mean_value'][problems] = V.mean(axis=1)
+    return BatchResults(table, values, q, policies, curves)
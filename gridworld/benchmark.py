@@ -0,0 +1,202 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from gridworld import dp
+from gridworld.engine import GridWorldEngine
+from gridworld.env import GridWorldEnv, SwappingGridWorldEnv
+from gridworld.layout import load_layout
+from gridworld.model import GridModel
+
+# Headless benchmarks of every solver on n x n layouts (or layout files).
+# Emits one JSON document, so runs from two versions can be diffed:
+#
+#   python -m gridworld.benchmark --sizes 5 50 200 --out before.json
+#
+# Per run: wall time, sweeps/rounds/episodes, backups or episodes per second,
+# peak traced memory (from a second, traced run so tracing doesn't skew the
+# timing) and the max error against an exact reference solution.
+
+DP_SOLVERS = ['value_iteration', 'value_iteration_gauss_seidel', 'value_iteration_prioritized',
+              'bellman_equation', 'iterative_policy_evaluation', 'policy_iteration',
+              'modified_policy_iteration']
+MC_SOLVERS = ['mc_exploring_starts', 'mc_fixed_start', 'mc_swap', 'mc_importance_sampling']
+# DP solvers that do per-state Python work (prioritized sweeping's heap) or a
+# linear solve per round; skipped above --dp-limit states
+SLOW_DP_SOLVERS = ['value_iteration_prioritized', 'policy_iteration']
+
+
+def benchmark_model(n):
+    # The Part 2 layout stretched to n x n (identical for n = 5): blue (0, 1)
+    # jumps to (n-2, n/2), green (0, n-1) to red (n-1, n/2) or yellow
+    # (n-1, n-1), terminals at (n/2, n-1) and (n-1, 0)
+    red, yellow = (n - 1, n // 2), (n - 1, n - 1)
+    teleports = {
+        (0, 1): ([((n - 2, n // 2), 1.0)], 5.0),
+        (0, n - 1): ([(red, 0.5), (yellow, 0.5)], 2.5),
+    }
+    return GridModel(n, teleports, step_reward=-0.2, terminals=((n // 2, n - 1), (n - 1, 0)))
+
+
+def run_solver(name, engine, options):
+    uniform = np.full(engine.model.n_actions, 1.0 / engine.model.n_actions)
+    if name == 'value_iteration':
+        engine.Value_Iteration(options.gamma, options.epsilon)
+    elif name == 'value_iteration_gauss_seidel':
+        engine.Value_Iteration(options.gamma, options.epsilon, schedule='gauss_seidel')
+    elif name == 'value_iteration_prioritized':
+        engine.Value_Iteration(options.gamma, options.epsilon, schedule='prioritized')
+    elif name == 'bellman_equation':
+        # As Part1-1's Bellman_Equation: the equiprobable policy, sum-norm stop
+        engine.Policy_Evaluation(uniform, options.gamma, options.epsilon, norm='sum')
+    elif name == 'iterative_policy_evaluation':
+        engine.Iterative_Policy_Evaluation(options.gamma, options.epsilon)
+    elif name == 'policy_iteration':
+        engine.Policy_Iteration(options.gamma)
+    elif name == 'modified_policy_iteration':
+        engine.Modified_Policy_Iteration(options.gamma, options.epsilon, k='adaptive')
+    elif name in ('mc_exploring_starts', 'mc_fixed_start', 'mc_swap'):
+        engine.Monte_Carlo(name == 'mc_exploring_starts', options.gamma, n_episodes=options.episodes,
+                           batch_size=options.batch_size)
+    elif name == 'mc_importance_sampling':
+        engine.Monte_Carlo_Importance_Sampling(options.gamma, n_episodes=options.episodes)
+    else:
+        raise ValueError(f"Unknown solver: {name!r}")
+
+
+def make_engine(name, model_factory, seed):
+    model = model_factory()
+    if name == 'mc_swap':
+        n_cols = model.n_cols
+        env = SwappingGridWorldEnv(model, cells=((0, 1), (0, n_cols - 1)))
+    else:
+        env = GridWorldEnv(model)
+    return GridWorldEngine(env, seed=seed)
+
+
+def reference_values(model, gamma):
+    # Exact optimal values and exact values of the equiprobable policy
+    uniform = np.full(model.n_actions, 1.0 / model.n_actions)
+    optimal, _, _, _ = dp.policy_iteration(model, np.zeros(model.shape), gamma)
+    return optimal.ravel(), dp.exact_policy_evaluation(model, uniform, gamma)
+
+
+def solution_error(name, engine, model, reference, gamma):
+    # Max |V - V_ref| over the states. Monte Carlo is scored on its greedy
+    # policy, evaluated exactly on the original layout.
+    if reference is None:
+        return None
+    optimal, uniform = reference
+    if name == 'bellman_equation':
+        return float(np.abs(engine.values.ravel() - uniform).max())
+    if name in MC_SOLVERS:
+        V = dp.exact_policy_evaluation(model, np.argmax(engine.Q, axis=1), gamma)
+        return float(np.abs(V - optimal).max())
+    return float(np.abs(engine.values.ravel() - optimal).max())
+
+
+def run_case(name, model_factory, options, reference):
+    model = model_factory()
+    engine = make_engine(name, model_factory, options.seed)
+    start = time.perf_counter()
+    run_solver(name, engine, options)
+    wall_time = time.perf_counter() - start
+
+    result = {
+        'solver': name,
+        'states': model.n_states,
+        'shape': list(model.shape),
+        'wall_time': wall_time,
+        'seed': engine.run_seed or {'entropy': engine.seed, 'spawn_key': []},
+    }
+    if name in MC_SOLVERS:
+        result['episodes'] = engine.episodes_run
+        result['episodes_per_second'] = engine.episodes_run / wall_time
+        result['stop_reason'] = engine.stop_reason
+    elif name == 'policy_iteration':
+        result['iterations'] = engine.rounds  # Linear solves, not sweeps
+    else:
+        result['iterations'] = engine.solve_stats['sweeps']
+        result['backups'] = engine.solve_stats['backups']
+        result['backups_per_second'] = engine.solve_stats['backups'] / wall_time
+    result['error'] = solution_error(name, engine, model, reference, options.gamma)
+
+    if options.memory:
+        engine = make_engine(name, model_factory, options.seed)
+        tracemalloc.start()
+        run_solver(name, engine, options)
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def run_benchmarks(options):
+    layouts = [(f"{n}x{n}", lambda n=n: benchmark_model(n)) for n in options.sizes]
+    layouts += [(path, lambda path=path: load_layout(path)) for path in options.layouts]
+
+    results = []
+    for layout, model_factory in layouts:
+        model = model_factory()
+        reference = None
+        if model.n_states <= options.reference_limit:
+            reference = reference_values(model, options.gamma)
+        for name in options.solvers:
+            if name in MC_SOLVERS and model.n_states > options.mc_limit:
+                continue
+            if name in SLOW_DP_SOLVERS and model.n_states > options.dp_limit:
+                continue
+            result = run_case(name, model_factory, options, reference)
+            result['layout'] = layout
+            results.append(result)
+            print(f"{layout:>12} {name:<30} {result['wall_time']:9.3f}s", file=sys.stderr)
+
+    return {
+        'label': options.label,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'options': {key: value for key, value in vars(options).items() if key != 'out'},
+        'results': results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the GridWorld solvers")
+    parser.add_argument('--sizes', type=int, nargs='*', default=[5, 25, 100], help="n for n x n layouts")
+    parser.add_argument('--layouts', nargs='*', default=[], help="layout files to benchmark as well")
+    parser.add_argument('--solvers', nargs='*', default=DP_SOLVERS + MC_SOLVERS, choices=DP_SOLVERS + MC_SOLVERS)
+    parser.add_argument('--gamma', type=float, default=0.95)
+    parser.add_argument('--epsilon', type=float, default=0.001)
+    parser.add_argument('--episodes', type=int, default=1000, help="Monte Carlo episodes per run")
+    parser.add_argument('--batch-size', type=int, default=1, help="Monte Carlo episode batch size")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mc-limit', type=int, default=100, help="skip Monte Carlo above this many states")
+    parser.add_argument('--dp-limit', type=int, default=2500,
+                        help="skip prioritized sweeping and policy iteration above this many states")
+    parser.add_argument('--reference-limit', type=int, default=10000,
+                        help="skip the reference solution (and errors) above this many states")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="skip the traced memory run")
+    parser.add_argument('--label', default=None, help="version label stored with the results")
+    parser.add_argument('--out', default=None, help="output file (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    report = run_benchmarks(options)
+    text = json.dumps(report, indent=2)
+    if options.out:
+        with open(options.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
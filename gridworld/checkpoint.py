@@ -0,0 +1,72 @@
+import json
+import os
+import time
+
+import numpy as np
+
+# Solver checkpoints: one uncompressed .npz file holding the solver's arrays
+# plus a JSON '__meta__' entry (solver name and options, RNG states, counters).
+# A checkpoint is written to a temporary file next to the target and moved
+# over it with os.replace, so readers only ever see a complete checkpoint.
+
+
+def save_checkpoint(path, arrays, meta):
+    path = os.fspath(path)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        np.savez(f, __meta__=np.array(json.dumps(meta)), **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    # Returns (arrays, meta)
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files if name != '__meta__'}
+        meta = json.loads(str(data['__meta__']))
+    return arrays, meta
+
+
+def rng_state(rng):
+    return rng.bit_generator.state
+
+
+def restore_rng(state):
+    bit_generator = getattr(np.random, state['bit_generator'])()
+    bit_generator.state = state
+    return np.random.Generator(bit_generator)
+
+
+class Checkpointer:
+    # Decides when a run saves: at most once every `seconds` (and/or every
+    # `episodes` episodes or sweeps), and always at the end of the run.
+    # Solvers only save between episode batches, so a resumed run continues
+    # exactly where the checkpoint left off.
+    def __init__(self, path, seconds=5.0, episodes=None):
+        self.path = path
+        self.seconds = seconds
+        self.episodes = episodes
+        self.saves = 0
+        self.reset()
+
+    def reset(self, count=0):
+        self.last_time = time.perf_counter()
+        self.last_count = count
+
+    def due(self, count):
+        if self.episodes is not None and count - self.last_count >= self.episodes:
+            return True
+        return self.seconds is not None and time.perf_counter() - self.last_time >= self.seconds
+
+    def save(self, arrays, meta, count=0):
+        save_checkpoint(self.path, arrays, meta)
+        self.saves += 1
+        self.reset(count)
+
+
+def as_checkpointer(checkpoint):
+    # A Checkpointer, a path (saved every 5 seconds) or None
+    if checkpoint is None or isinstance(checkpoint, Checkpointer):
+        return checkpoint
+    return Checkpointer(checkpoint)
@@ -0,0 +1,309 @@
+import heapq
+import inspect
+
+import numpy as np
+
+try:  # Optional: sparse iterative solver for large grids (SciPy >= 1.1)
+    from scipy import sparse
+    from scipy.sparse import linalg as sparse_linalg
+    # gmres' relative tolerance is 'rtol' from SciPy 1.12, 'tol' before
+    GMRES_RTOL = 'rtol' if 'rtol' in inspect.signature(sparse_linalg.gmres).parameters else 'tol'
+except ImportError:
+    sparse = None
+
+
+DENSE_LIMIT = 2000  # Largest state count solved with a dense matrix by default
+
+
+def q_values(model, values, gamma):
+    # One batched Bellman backup: Q[s, a] = R[s, a] + gamma * sum_s' P[s, a, s'] V[s']
+    return model.R + gamma * model.expected_next_values(values.ravel())
+
+
+def residual(new_values, values, norm='max'):
+    diff = np.abs(new_values - values)
+    return diff.sum() if norm == 'sum' else diff.max()
+
+
+def greedy_mask(q, tie_tol=1e-9):
+    # All maximizing actions per state, as an (S, A) boolean mask
+    return q >= q.max(axis=1, keepdims=True) - tie_tol
+
+
+def backup(model, V, gamma, states=slice(None), pi=None):
+    # Bellman backup of the given states: the best action value, or the
+    # expected value under pi when evaluating a fixed policy
+    q = model.R[states] + gamma * (model.next_probs[states] * V[model.next_states[states]]).sum(axis=-1)
+    return q.max(axis=-1) if pi is None else (pi[states] * q).sum(axis=-1)
+
+
+def checkerboard(model):
+    # Red-black ordering of the cells, so a sweep is two vectorized
+    # half-sweeps. Moves to a neighbour lead to the other colour and see the
+    # values of the first half-sweep, as in in-place Gauss-Seidel. Self-loops
+    # (bounces off edges and walls, terminals) and teleports between cells
+    # of the same colour, like (0, 1) -> (3, 2), are backed up from the
+    # values at the start of their half-sweep, i.e. Jacobi within a colour.
+    i, j = np.divmod(np.arange(model.n_states), model.n_cols)
+    black = (i + j) % 2 == 1
+    return np.flatnonzero(~black), np.flatnonzero(black)
+
+
+def predecessors(model):
+    # Reverse dependencies from the successor table, in CSR form:
+    # preds[indptr[s]:indptr[s + 1]] are the states with a transition into s
+    S, A, K = model.next_states.shape
+    source = np.repeat(np.arange(S, dtype=np.int64), A * K)
+    target = model.next_states.reshape(-1).astype(np.int64)
+    keep = model.next_probs.reshape(-1) > 0
+    pairs = np.unique(target[keep] * S + source[keep])
+    target, preds = np.divmod(pairs, S)
+    indptr = np.searchsorted(target, np.arange(S + 1))
+    return indptr, preds
+
+
+def resolve(model, values, changed, gamma=0.95, epsilon=0.01, action_probs=None, callback=None, stats=None):
+    # Incremental re-solve after a small layout change, warm-started from
+    # values: sweeps back up only a dirty set, starting with the changed
+    # states; a state whose value moves by epsilon or more puts its
+    # predecessors (model.predecessors) in the next set. Stops when a sweep
+    # moves nothing by epsilon, like the max-norm sync schedule. Value
+    # iteration by default, evaluation of action_probs ((A,) or (S, A)) when
+    # given. Returns the value grid and the Q table.
+    V = values.ravel().astype(float)
+    pi = None if action_probs is None else np.broadcast_to(np.asarray(action_probs, dtype=float), model.R.shape)
+    dirty = np.unique(np.asarray(changed, dtype=np.int64))
+    sweeps = 0
+    backups = 0
+    while dirty.size:
+        new_values = backup(model, V, gamma, dirty, pi)
+        moved = dirty[np.abs(new_values - V[dirty]) >= epsilon]
+        V[dirty] = new_values
+        backups += dirty.size
+        sweeps += 1
+        if callback is not None:
+            callback(V.reshape(values.shape))
+        dirty = model.predecessors(moved) if moved.size else moved
+
+    if stats is not None:
+        stats['sweeps'] = sweeps
+        stats['backups'] = backups * model.n_actions
+    return V.reshape(values.shape), q_values(model, V, gamma)
+
+
+def solve(model, values, gamma, epsilon, norm, callback, pi=None, schedule='sync', stats=None):
+    # Iterates Bellman backups until the values settle.
+    # schedule: 'sync' (Jacobi sweeps from the previous values), 'gauss_seidel'
+    # (in place, red-black order) or 'prioritized' (prioritized sweeping: one
+    # state at a time, largest Bellman error first; stops when every error is
+    # below epsilon, whatever the norm). stats, if given, is a dict that
+    # receives the number of sweeps and of (state, action) backups, and the
+    # residual of every sweep (not for 'prioritized').
+    V = values.ravel().astype(float)
+    S = model.n_states
+    sweeps = backups = 0
+    residuals = []
+
+    if schedule == 'sync':
+        while True:
+            new_V = backup(model, V, gamma, pi=pi)
+            sweeps += 1
+            backups += S
+            residuals.append(residual(new_V, V, norm))
+            if residuals[-1] < epsilon:
+                break
+            V = new_V
+            if callback is not None:
+                callback(V.reshape(values.shape))
+
+    elif schedule == 'gauss_seidel':
+        colours = checkerboard(model)
+        while True:
+            old_V = V.copy()
+            for cells in colours:
+                V[cells] = backup(model, V, gamma, cells, pi)
+            sweeps += 1
+            backups += S
+            residuals.append(residual(V, old_V, norm))
+            if callback is not None:
+                callback(V.reshape(values.shape))
+            if residuals[-1] < epsilon:
+                break
+
+    elif schedule == 'prioritized':
+        indptr, preds = predecessors(model)
+        priority = np.abs(backup(model, V, gamma, pi=pi) - V)
+        backups += S
+        heap = [(-error, s) for s, error in enumerate(priority.tolist()) if error >= epsilon]
+        heapq.heapify(heap)
+        updates = 0
+        while heap:
+            error, s = heapq.heappop(heap)
+            if -error != priority[s]:
+                continue  # Stale entry, the state was re-queued since
+            V[s] = backup(model, V, gamma, s, pi)
+            priority[s] = 0.0
+            updates += 1
+
+            # The update changes the Bellman error of every predecessor
+            ps = preds[indptr[s]:indptr[s + 1]]
+            errors = np.abs(backup(model, V, gamma, ps, pi) - V[ps])
+            priority[ps] = errors
+            backups += 1 + len(ps)
+            for p, error in zip(ps.tolist(), errors.tolist()):
+                if error >= epsilon:
+                    heapq.heappush(heap, (-error, p))
+
+            if updates % S == 0 and callback is not None:
+                callback(V.reshape(values.shape))
+        sweeps = updates / S
+
+    else:
+        raise ValueError(f"Unknown schedule: {schedule!r}")
+
+    if stats is not None:
+        stats['sweeps'] = sweeps
+        stats['backups'] = backups * model.n_actions
+        stats['residuals'] = np.array(residuals, dtype=float)
+    return V
+
+
+def policy_evaluation(model, values, action_probs, gamma=0.95, epsilon=0.01, norm='max', callback=None,
+                      schedule='sync', stats=None):
+    # Evaluation of a fixed stochastic policy; action_probs is (A,) or (S, A)
+    pi = np.broadcast_to(np.asarray(action_probs, dtype=float), model.R.shape)
+    V = solve(model, values, gamma, epsilon, norm, callback, pi, schedule, stats)
+    return V.reshape(values.shape)
+
+
+def value_iteration(model, values, gamma=0.95, epsilon=0.01, norm='max', callback=None, schedule='sync',
+                    stats=None):
+    # Value iteration; returns the value grid and the final Q table
+    V = solve(model, values, gamma, epsilon, norm, callback, None, schedule, stats)
+    return V.reshape(values.shape), q_values(model, V, gamma)
+
+
+def policy_probs(model, policy):
+    # (S, A) action probabilities from (S,) greedy action ids or an (A,) / (S, A) distribution
+    policy = np.asarray(policy)
+    if policy.ndim == 1 and np.issubdtype(policy.dtype, np.integer):
+        pi = np.zeros(model.R.shape)
+        pi[np.arange(model.n_states), policy] = 1.0
+        return pi
+    return np.broadcast_to(policy.astype(float), model.R.shape)
+
+
+def exact_policy_evaluation(model, policy, gamma=0.95, solver='auto', values=None, tol=1e-10):
+    # Solves (I - gamma P_pi) V = R_pi. solver: 'dense' (LU, small grids),
+    # 'sparse' (preconditioned GMRES, needs scipy; values warm-starts it) or
+    # 'auto' (dense up to DENSE_LIMIT states or without scipy)
+    pi = policy_probs(model, policy)
+    S = model.n_states
+    R_pi = (pi * model.R).sum(axis=1)
+    rows = np.repeat(np.arange(S), model.next_states.shape[1] * model.next_states.shape[2])
+    cols = model.next_states.reshape(-1)
+    probs = (pi[:, :, None] * model.next_probs).reshape(-1)
+
+    if solver == 'auto':
+        solver = 'dense' if S <= DENSE_LIMIT or sparse is None else 'sparse'
+    if solver == 'dense':
+        M = np.eye(S)
+        np.add.at(M, (rows, cols), -gamma * probs)
+        return np.linalg.solve(M, R_pi)
+    if solver == 'sparse':
+        if sparse is None:
+            raise ImportError("The sparse solver needs scipy")
+        P_pi = sparse.csc_matrix((probs, (rows, cols)), shape=(S, S))
+        M = sparse.identity(S, format='csc') - gamma * P_pi
+        # GMRES alone stalls as gamma -> 1; an incomplete LU preconditioner
+        # keeps it to a few iterations. Falls back to a direct sparse solve.
+        ilu = sparse_linalg.spilu(M, drop_tol=1e-4)
+        preconditioner = sparse_linalg.LinearOperator((S, S), ilu.solve)
+        x0 = None if values is None else np.ravel(values)
+        V, info = sparse_linalg.gmres(M, R_pi, x0=x0, M=preconditioner, atol=0.0, restart=50, maxiter=100,
+                                      **{GMRES_RTOL: tol})
+        if info != 0:
+            V = sparse_linalg.spsolve(M, R_pi)
+        return V
+    raise ValueError(f"Unknown solver: {solver!r}")
+
+
+def greedy_actions(q, actions=None, tie_tol=1e-9):
+    # Vectorized improvement step: the best action per state, keeping the
+    # current action when it ties with the best so policies don't flip-flop
+    best = np.argmax(q, axis=1)
+    if actions is None:
+        return best
+    keep = q[np.arange(len(q)), actions] >= q.max(axis=1) - tie_tol
+    return np.where(keep, actions, best)
+
+
+def policy_iteration(model, values, gamma=0.95, solver='auto', actions=None, max_rounds=1000, callback=None):
+    # Howard's policy iteration with exact evaluation. callback(V grid, actions)
+    # runs after every improvement step; returns the value grid, Q table,
+    # greedy actions and the number of rounds.
+    V = values.ravel().astype(float)
+    if actions is None:
+        actions = greedy_actions(q_values(model, V, gamma))  # Start greedy w.r.t. the initial values
+    for rounds in range(1, max_rounds + 1):
+        V = exact_policy_evaluation(model, actions, gamma, solver, V)
+        q = q_values(model, V, gamma)
+        new_actions = greedy_actions(q, actions)
+        stable = np.array_equal(new_actions, actions)
+        actions = new_actions
+        if callback is not None:
+            callback(V.reshape(values.shape), actions)
+        if stable:
+            break
+    return V.reshape(values.shape), q, actions, rounds
+
+
+def modified_policy_iteration(model, values, gamma=0.95, epsilon=0.01, norm='max', callback=None, k=5,
+                              k_max=100, eta=0.1, stats=None):
+    # Between value iteration (k = 0) and policy iteration (k -> inf): each
+    # greedy improvement backup is followed by k sweeps evaluating the greedy
+    # policy. k='adaptive' evaluates until the evaluation residual drops below
+    # eta times the improvement residual, or k_max sweeps. Stops on the same
+    # residual test as value_iteration; returns the value grid, Q table and
+    # greedy actions.
+    V = values.ravel().astype(float)
+    S = model.n_states
+    states = np.arange(S)
+    actions = None
+    improvements = sweeps = 0
+    residuals = []
+    while True:
+        # Improvement: one full backup, which also gives the stopping residual
+        q = q_values(model, V, gamma)
+        actions = greedy_actions(q, actions)
+        new_V = q[states, actions]
+        improvements += 1
+        delta = residual(new_V, V, norm)
+        residuals.append(delta)
+        if delta < epsilon:
+            break
+        V = new_V
+
+        # Partial evaluation of the greedy policy: one action per state, so a
+        # sweep costs 1/A of an improvement backup
+        R_pi = model.R[states, actions]
+        next_states = model.next_states[states, actions]
+        next_probs = model.next_probs[states, actions]
+        n_sweeps = k_max if k == 'adaptive' else k
+        for _ in range(n_sweeps):
+            new_V = R_pi + gamma * (next_probs * V[next_states]).sum(axis=1)
+            sweeps += 1
+            eval_delta = residual(new_V, V, norm)
+            V = new_V
+            if k == 'adaptive' and eval_delta < eta * delta:
+                break
+
+        if callback is not None:
+            callback(V.reshape(values.shape))
+
+    if stats is not None:
+        stats['improvements'] = improvements
+        stats['sweeps'] = improvements + sweeps
+        stats['backups'] = S * (improvements * model.n_actions + sweeps)
+        stats['residuals'] = np.array(residuals, dtype=float)  # Of the improvement backups
+    return V.reshape(values.shape), q, actions
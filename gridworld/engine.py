@@ -0,0 +1,718 @@
+import time
+
+import numpy as np
+
+from gridworld import dp, mc
+from gridworld.checkpoint import as_checkpointer, load_checkpoint, restore_rng, rng_state
+from gridworld.env import BufferPool
+from gridworld.parallel import ParallelMonteCarlo
+from gridworld.policy import Policy
+from gridworld.profiling import Profiler
+from gridworld.stopping import StoppingCriteria
+from gridworld.store import as_store
+from gridworld.model import ACTIONS
+
+
+def as_seed_sequence(seed):
+    # An int, a SeedSequence or a recorded run seed ({'entropy', 'spawn_key'})
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, dict):
+        return np.random.SeedSequence(seed['entropy'], spawn_key=seed['spawn_key'])
+    return np.random.SeedSequence(seed)
+
+
+class Observer:
+    # A progress subscriber; it is called on every `every`-th event, and at most
+    # once per `min_interval` seconds. 'done' events are always delivered.
+    def __init__(self, callback, every=1, min_interval=0.0):
+        self.callback = callback
+        self.every = every
+        self.min_interval = min_interval
+        self.count = 0
+        self.last_time = 0.0
+
+    def __call__(self, event, engine):
+        self.count += 1
+        if event != 'done':
+            if self.count % self.every:
+                return
+            if self.min_interval:
+                now = time.perf_counter()
+                if now - self.last_time < self.min_interval:
+                    return
+                self.last_time = now
+        self.callback(event, engine)
+
+
+class GridWorldEngine:
+    # Headless GridWorld: holds the environment, the value/policy state and the
+    # solvers. Front-ends subscribe to progress events ('sweep', 'round',
+    # 'episode', 'layout', 'done') instead of being called from the solve loops.
+    #
+    # All randomness comes from one SeedSequence per engine: the engine's own
+    # Generator (start states, tie-breaking), the environment's and the
+    # workers' streams are spawned from it. seed=None draws fresh entropy,
+    # which is kept in self.seed so any run can be replayed.
+    #
+    # profile=True times the solver phases and counts sweeps, backups,
+    # episodes, steps and first-visit checks (see profiling.Profiler); each
+    # solve starts from zero and its snapshot is left in self.profile before
+    # the 'done' event.
+    def __init__(self, env, seed=None, profile=False):
+        self.env = env
+        self.env.on_change = self.on_layout_change
+        self.actions = list(ACTIONS)
+        self.observers = []
+        self.seed_seq = as_seed_sequence(seed)
+        self.seed = self.seed_seq.entropy
+        engine_seq, env_seq = self.seed_seq.spawn(2)
+        self.rng = np.random.default_rng(engine_seq)
+        self.env.rng = np.random.default_rng(env_seq)
+        self.run_seed = None
+        self.profiler = Profiler(profile)
+        self.profile = None
+        self.resume_state = None  # Checkpoint (arrays, meta) the next solve continues from
+        self.reset()
+
+    @property
+    def model(self):
+        return self.env.model
+
+    @property
+    def grid_size(self):
+        return self.model.grid_size
+
+    @property
+    def values(self):
+        # The value grid. Monte Carlo solvers only update Q; V is derived from
+        # it when read: the mean of Q over the actions, weighted by visits
+        # (or importance weights)
+        if self.value_weights is not None:
+            stats = mc.MCStats(self.Q, self.value_weights, None)
+            self._values = stats.state_values().reshape(self.model.shape)
+            self.value_weights = None
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+        self.value_weights = None
+
+    def values_from_q(self, weights):
+        # Marks the values stale after a Q update; weights are N or C
+        self.value_weights = weights
+
+    def reset(self):
+        self.values = np.zeros(self.model.shape)
+        self.policy = Policy.empty(self.model.shape)
+        self.action_probs = {a: 1.0 / len(self.actions) for a in self.actions}
+        self.reset_mc_policies()
+        self.changed_states = np.zeros(0, dtype=np.int64)  # Layout changes since the last solve
+        self.solve_sweeps = 0
+        self.Q = None  # Q table of the last solve
+        self.convergence = np.zeros((0, 2))
+
+    def reset_mc_policies(self):
+        S, A = self.model.n_states, len(self.actions)
+        self.behavior_probs = np.full(A, 1.0 / A)  # Monte Carlo behaviour policy
+        self.target_policy_probs = np.full((S, A), 1.0 / A)
+
+    def subscribe(self, callback, every=1, min_interval=0.0):
+        observer = Observer(callback, every, min_interval)
+        self.observers.append(observer)
+        return observer
+
+    def unsubscribe(self, observer):
+        self.observers.remove(observer)
+
+    def spawn(self, n=1):
+        # Independent child SeedSequences, e.g. for workers or batches
+        return self.seed_seq.spawn(n)
+
+    def begin_run(self, seed=None):
+        # A stochastic run draws from a fresh child stream of the engine seed,
+        # or from `seed` when given. self.run_seed records it; passing it back
+        # as seed replays the run, on this engine or a fresh one: the
+        # behaviour and target policies start uniform again and the
+        # environment goes back to its initial layout (see
+        # SwappingGridWorldEnv.reset_layout). Returns the sequence left for
+        # worker processes.
+        self.reset_mc_policies()
+        self.env.reset_layout()
+        seq = self.spawn()[0] if seed is None else as_seed_sequence(seed)
+        self.run_seed = {'entropy': seq.entropy, 'spawn_key': list(seq.spawn_key)}
+        run_seq, env_seq, worker_seq = seq.spawn(3)
+        self.rng = np.random.default_rng(run_seq)
+        self.env.rng = np.random.default_rng(env_seq)
+        return worker_seq
+
+    def begin_solve(self, stats=None):
+        # Common start of every DP solve. DP is deterministic, so a run seed
+        # left by an earlier Monte Carlo run no longer applies.
+        self.run_seed = None
+        self.solve_stats = {} if stats is None else stats
+        self.profiler.reset()
+
+    def notify(self, event):
+        if event == 'done':
+            self.profile = self.profiler.snapshot()
+        with self.profiler.phase('observers'):
+            for observer in self.observers:
+                observer(event, self)
+
+    def on_layout_change(self, states):
+        self.changed_states = np.union1d(self.changed_states, states)
+        self.notify('layout')
+
+    def on_sweep(self, values):
+        self.values = values
+        self.notify('sweep')
+
+    def count_solve(self):
+        self.profiler.count('sweeps', self.solve_stats.get('sweeps', 0))
+        self.profiler.count('backups', self.solve_stats.get('backups', 0))
+        residuals = self.solve_stats.get('residuals', np.zeros(0))
+        self.convergence = np.column_stack((np.arange(1, len(residuals) + 1), residuals))
+
+    def greedy_policy(self, q):
+        # Every maximizing action of each non-terminal state, as a Policy
+        return Policy.from_q(q, self.model.shape, self.model.is_terminal)
+
+    def actions_policy(self, best_actions):
+        return Policy.from_actions(best_actions, self.model.shape, self.model.is_terminal)
+
+    # Checkpoints
+    #
+    # Solvers given checkpoint= (a checkpoint.Checkpointer or a path) save
+    # their full state every few seconds: arrays, RNG states, the layout,
+    # counters and the convergence history. resume(path) continues the run
+    # exactly where the checkpoint left off.
+
+    def checkpoint_saver(self, checkpoint, solver, options, arrays, stopping=None):
+        # save(final=False) writes a checkpoint when one is due; arrays() gives
+        # the solver's own arrays
+        checkpoint = as_checkpointer(checkpoint)
+        if checkpoint is None:
+            return None
+
+        def save(final=False):
+            count = stopping.episodes if stopping is not None else self.solve_sweeps
+            if not (final or checkpoint.due(count)):
+                return
+            with self.profiler.phase('checkpoints'):
+                state = dict(arrays())
+                state['values'] = self.values
+                state['policy_actions'] = self.policy.actions
+                state['policy_ties'] = self.policy.ties
+                state['layout_terminals'] = self.model.is_terminal & ~self.model.is_wall
+                meta = {
+                    'solver': solver,
+                    'options': options,
+                    'rng': rng_state(self.rng),
+                    'env_rng': rng_state(self.env.rng),
+                    'run_seed': self.run_seed,
+                    'teleports': self.teleport_list(),
+                    'sweeps': self.solve_sweeps,
+                }
+                if stopping is not None:
+                    stopping_arrays, meta['stopping'] = stopping.get_state()
+                    state.update({'stopping_' + name: array for name, array in stopping_arrays.items()})
+                checkpoint.save(state, meta, count)
+            self.profiler.count('checkpoints')
+
+        checkpoint.reset()
+        return save
+
+    def teleport_list(self):
+        return [[list(cell), [[list(target), prob] for target, prob in targets], reward]
+                for cell, (targets, reward) in self.model.teleports.items()]
+
+    def restore_run(self, stopping=None):
+        # Applies a pending resume state (see resume): RNG streams, layout,
+        # values, policy and stopping counters. Returns the checkpoint arrays,
+        # or None when there is nothing to resume.
+        if self.resume_state is None:
+            return None
+        arrays, meta = self.resume_state
+        self.resume_state = None
+        self.rng = restore_rng(meta['rng'])
+        self.env.rng = restore_rng(meta['env_rng'])
+        self.run_seed = meta['run_seed']
+        self.solve_sweeps = meta['sweeps']
+
+        model = self.model
+        terminals = arrays['layout_terminals']
+        if meta['teleports'] != self.teleport_list() or not np.array_equal(terminals, model.is_terminal & ~model.is_wall):
+            model.teleports = {tuple(cell): ([(tuple(target), prob) for target, prob in targets], reward)
+                               for cell, targets, reward in meta['teleports']}
+            model.terminals = terminals.reshape(model.shape)
+            model.build()
+            self.env.compile()
+
+        self.values = arrays['values'].copy()
+        self.policy = Policy(arrays['policy_actions'], arrays['policy_ties'], self.model.shape)
+        if stopping is not None:
+            stopping.set_state({name[len('stopping_'):]: array for name, array in arrays.items()
+                                if name.startswith('stopping_')}, meta['stopping'])
+        return arrays
+
+    def resume(self, path, stopping=None, checkpoint=None):
+        # Continues a checkpointed run. The solver and its options come from
+        # the checkpoint, and so do the stopping criteria unless new ones are
+        # given. Saving continues to `checkpoint`, by default the same file.
+        arrays, meta = load_checkpoint(path)
+        self.resume_state = (arrays, meta)
+        options = dict(meta['options'])
+        if 'stopping' in meta:
+            options['stopping'] = stopping or StoppingCriteria(**meta['stopping']['config'])
+        return getattr(self, meta['solver'])(**options, checkpoint=path if checkpoint is None else checkpoint)
+
+    # Results
+
+    def save_results(self, store, **meta):
+        # Appends the values, Q table, policy and convergence curve ((n, 2)
+        # rows of sweep or episode count, residual) of the last solve to a
+        # result store (a store.ResultStore or a path), with meta as the
+        # run's metadata. Returns the run id.
+        meta = dict(shape=list(self.model.shape), seed=self.seed, run_seed=self.run_seed, **meta)
+        run = {'values': self.values, 'q': self.Q, 'policy_actions': self.policy.actions,
+               'policy_ties': self.policy.ties, 'curve': self.convergence, 'meta': meta}
+        return as_store(store).append([run])[0]
+
+    # Dynamic programming
+
+    # schedule: 'sync', 'gauss_seidel' or 'prioritized' (see dp.solve); the
+    # sweep and backup counts of the last solve are left in self.solve_stats
+
+    def Policy_Evaluation(self, action_probs=None, gamma=0.95, epsilon=0.01, norm='max', schedule='sync',
+                          checkpoint=None):
+        if action_probs is None:
+            action_probs = [self.action_probs[a] for a in self.actions]
+        options = dict(action_probs=np.asarray(action_probs, dtype=float).tolist(), gamma=gamma, epsilon=epsilon,
+                       norm=norm, schedule=schedule)
+        on_sweep = self.start_solve('Policy_Evaluation', options, checkpoint)
+        with self.profiler.phase('backups'):
+            self.values = dp.policy_evaluation(self.model, self.values, action_probs, gamma, epsilon, norm,
+                                               callback=on_sweep, schedule=schedule, stats=self.solve_stats)
+        self.Q = dp.q_values(self.model, self.values, gamma)
+        self.count_solve()
+        self.notify('done')
+        return self.values
+
+    def start_solve(self, solver, options, checkpoint):
+        # Common setup of the checkpointable DP solves; returns the sweep
+        # callback. self.solve_sweeps counts sweeps across resumes.
+        self.begin_solve()
+        self.solve_sweeps = 0
+        self.restore_run()
+        save = self.checkpoint_saver(checkpoint, solver, options, dict)
+        if save is None:
+            return self.on_sweep
+
+        def on_sweep(values):
+            self.solve_sweeps += 1
+            self.on_sweep(values)
+            save()
+        return on_sweep
+
+    def Value_Iteration(self, gamma=0.95, epsilon=0.01, norm='max', schedule='sync', checkpoint=None):
+        on_sweep = self.start_solve('Value_Iteration', dict(gamma=gamma, epsilon=epsilon, norm=norm,
+                                                            schedule=schedule), checkpoint)
+        with self.profiler.phase('backups'):
+            self.values, q = dp.value_iteration(self.model, self.values, gamma, epsilon, norm,
+                                                callback=on_sweep, schedule=schedule, stats=self.solve_stats)
+        self.Q = q
+        with self.profiler.phase('policy_extraction'):
+            self.policy = self.greedy_policy(q)
+        self.count_solve()
+        self.notify('done')
+        return self.values
+
+    def Incremental_Resolve(self, gamma=0.95, epsilon=0.01, **delta):
+        # Re-solve after a small layout change, warm-started from the current
+        # values: only the changed states and the predecessors their values
+        # reach are backed up (see dp.resolve). delta is applied first (see
+        # GridModel.apply_delta: swap, teleports, terminals); changes made
+        # since the last solve, e.g. by SwappingGridWorldEnv, are included.
+        if delta:
+            self.env.apply_delta(**delta)
+        self.begin_solve()
+        with self.profiler.phase('backups'):
+            self.values, q = dp.resolve(self.model, self.values, self.changed_states, gamma, epsilon,
+                                        callback=self.on_sweep, stats=self.solve_stats)
+        self.changed_states = np.zeros(0, dtype=np.int64)
+        self.Q = q
+        with self.profiler.phase('policy_extraction'):
+            self.policy = self.greedy_policy(q)
+        self.count_solve()
+        self.notify('done')
+        return self.values
+
+    def Iterative_Policy_Evaluation(self, gamma=0.95, theta=0.01, between_rounds=None, schedule='sync',
+                                    incremental=False):
+        # incremental=True: after the first round, re-solve only from the
+        # layout changes made by between_rounds (see Incremental_Resolve)
+        old_policy = None
+        self.begin_solve({'sweeps': 0, 'backups': 0, 'residuals': np.zeros(0)})
+        self.rounds = 0
+        while True:
+            # Policy Evaluation
+            stats = {}
+            with self.profiler.phase('backups'):
+                if incremental and self.rounds:
+                    self.values, q = dp.resolve(self.model, self.values, self.changed_states, gamma, theta,
+                                                stats=stats)
+                else:
+                    self.values, q = dp.value_iteration(self.model, self.values, gamma, theta, norm='max',
+                                                        schedule=schedule, stats=stats)
+            self.changed_states = np.zeros(0, dtype=np.int64)
+            self.solve_stats['sweeps'] += stats['sweeps']
+            self.solve_stats['backups'] += stats['backups']
+            if 'residuals' in stats:
+                self.solve_stats['residuals'] = np.concatenate((self.solve_stats['residuals'], stats['residuals']))
+            self.rounds += 1
+
+            # Policy Improvement
+            with self.profiler.phase('policy_extraction'):
+                self.Q = dp.q_values(self.model, self.values, gamma)
+                self.policy = self.greedy_policy(self.Q)
+                policy_stable = self.policy == old_policy
+                old_policy = self.policy
+            self.notify('round')
+
+            if between_rounds is not None:
+                between_rounds()
+
+            if policy_stable:
+                break
+
+        self.count_solve()
+        self.notify('done')
+        return self.values
+
+    def Modified_Policy_Iteration(self, gamma=0.95, epsilon=0.01, norm='max', k=5):
+        # k evaluation sweeps per improvement step, or k='adaptive'
+        self.begin_solve()
+        with self.profiler.phase('backups'):
+            self.values, q, self.policy_actions = dp.modified_policy_iteration(
+                self.model, self.values, gamma, epsilon, norm, callback=self.on_sweep, k=k, stats=self.solve_stats)
+        self.Q = q
+        with self.profiler.phase('policy_extraction'):
+            self.policy = self.greedy_policy(q)
+        self.count_solve()
+        self.notify('done')
+        return self.values
+
+    def Policy_Iteration(self, gamma=0.95, solver='auto', between_rounds=None):
+        # True policy iteration: each policy is evaluated exactly by a linear
+        # solve (see dp.exact_policy_evaluation), then improved greedily for
+        # all states at once. Emits a 'round' event per improvement step.
+        def on_round(values, actions):
+            self.values = values
+            with self.profiler.phase('policy_extraction'):
+                self.policy = self.greedy_policy(dp.q_values(self.model, values, gamma))
+            self.notify('round')
+            if between_rounds is not None:
+                between_rounds()
+
+        self.begin_solve()
+        with self.profiler.phase('linear_solves'):
+            self.values, self.Q, self.policy_actions, self.rounds = dp.policy_iteration(
+                self.model, self.values, gamma, solver, callback=on_round)
+        self.convergence = np.zeros((0, 2))
+        self.profiler.count('rounds', self.rounds)
+        self.notify('done')
+        return self.values
+
+    # Monte Carlo
+    #
+    # Q, N and C are (S, A) arrays indexed by integer state and action ids;
+    # self.policy holds the greedy actions (see policy.Policy).
+
+    def update_policy(self, epsilon=0.1):
+        with self.profiler.phase('policy_extraction'):
+            best_actions = mc.greedy_actions(self.Q, self.rng)
+            # The behaviour policy is a single distribution shared by all states:
+            # the epsilon-greedy row of the last state updated, as the dict-based
+            # version left it
+            self.behavior_probs = mc.epsilon_greedy_probs(best_actions[-1:], len(self.actions), epsilon)[0]
+            self.policy = self.actions_policy(best_actions)
+
+    def start_states(self, count, exploring_starts=False, start_state=None):
+        # Exploring starts draw from every state; otherwise episodes start at
+        # start_state, or at one of the model's start states drawn uniformly
+        if exploring_starts:
+            return self.rng.integers(self.model.n_states, size=count)
+        if start_state is not None:
+            return np.full(count, self.model.state_index(*start_state))
+        starts = self.model.start_states
+        if len(starts) == 1:
+            return np.full(count, starts[0])
+        return self.rng.choice(starts, size=count)
+
+    def episode_stream(self, behavior_probs, stopping, exploring_starts=False, start_state=None, batch_size=1,
+                       before_batch=None, batches=False):
+        # Yields episodes until the stopping criteria fire; the consumer reports
+        # each processed episode with stopping.update(). With batch_size > 1
+        # episodes are drawn in vectorized batches from the behaviour policy
+        # current at batch start. behavior_probs may be a callable returning
+        # the current policy. before_batch() runs before each batch is drawn,
+        # when every earlier episode has been processed (checkpoints).
+        # batches=True yields each batch whole; the consumer then reports all
+        # of its episodes at once.
+        while stopping.reason is None:
+            if before_batch is not None:
+                before_batch()
+            count = stopping.remaining_episodes(batch_size)
+            starts = self.start_states(count, exploring_starts, start_state)
+            probs = behavior_probs() if callable(behavior_probs) else behavior_probs
+            with self.profiler.phase('episode_generation'):
+                if batch_size == 1:
+                    episodes = [self.env.generate_episode(probs, starts[0])]
+                else:
+                    episodes = self.env.generate_episodes(probs, starts)
+            if batches:
+                self.profiler.count('episodes', len(episodes))
+                self.profiler.count('steps', sum(len(states) for states, _, _ in episodes))
+                yield episodes
+                continue
+            for episode in episodes:
+                if stopping.reason is not None:
+                    return
+                self.profiler.count('episodes')
+                self.profiler.count('steps', len(episode[0]))
+                yield episode
+
+    def finish(self, stopping):
+        self.stop_reason = stopping.reason
+        self.episodes_run = stopping.episodes
+        self.convergence = np.array(stopping.history, dtype=float).reshape(-1, 2)
+        self.notify('done')
+        return self.policy
+
+    def Monte_Carlo(self, exploring_starts=True, gamma=0.95, epsilon=0.1, n_episodes=10000, start_state=None,
+                    visit='first', batch_size=1, n_workers=1, round_size=None, seed=None, stopping=None,
+                    checkpoint=None, buffers=None, step_size=None, max_steps=100000):
+        # visit: 'first' for first-visit MC, 'every' for every-visit MC.
+        # batch_size > 1 samples that many episodes at once from the current
+        # policy and applies them in one Q update, so the policy then lags up
+        # to batch_size episodes behind.
+        # step_size: the Q step-size schedule (see mc.as_step_size): sample
+        # averages by default, a float for constant alpha (nonstationary
+        # environments) or 'polynomial'.
+        # n_workers > 1 runs the episodes in parallel rounds (see run_parallel).
+        # stopping: a StoppingCriteria; defaults to a budget of n_episodes.
+        # The criterion that ended the run is left in self.stop_reason.
+        # seed: replays a recorded self.run_seed (or any seed); by default the
+        # run takes the next child stream of the engine seed.
+        # checkpoint: a checkpoint.Checkpointer or path; single process only.
+        # buffers: stream episodes through a fixed env.BufferPool (or a pool
+        # of two buffers of that many steps) instead of materializing them,
+        # so memory stays bounded however long episodes run (see run_streaming).
+        # max_steps: an episode still running after that many steps raises
+        # RuntimeError rather than being cut off (None: no limit).
+        stopping = stopping or StoppingCriteria(max_episodes=n_episodes)
+        self.env.max_steps = max_steps
+        worker_seq = self.begin_run(seed)
+        self.profiler.reset()
+        if n_workers > 1:
+            if checkpoint is not None:
+                raise ValueError("Checkpointing needs n_workers=1")
+            return self.run_parallel(n_workers, stopping, exploring_starts, start_state, gamma, epsilon,
+                                     visit=visit, round_size=round_size, worker_seq=worker_seq, step_size=step_size)
+
+        S, A = self.model.n_states, len(self.actions)
+        self.Q = np.zeros((S, A))
+        self.N = np.zeros((S, A), dtype=np.int64)
+        stopping.start(self.Q)
+        restored = self.restore_run(stopping)
+        if restored is not None:
+            self.Q, self.N, self.behavior_probs = restored['Q'], restored['N'], restored['behavior_probs']
+        if isinstance(buffers, int):
+            buffers = BufferPool(2, buffers)
+        step_size = mc.as_step_size(step_size)
+        options = dict(exploring_starts=exploring_starts, gamma=gamma, epsilon=epsilon,
+                       start_state=start_state and list(start_state), visit=visit, batch_size=batch_size,
+                       buffers=buffers and buffers.capacity, step_size=mc.step_size_spec(step_size),
+                       max_steps=max_steps)
+        save = self.checkpoint_saver(checkpoint, 'Monte_Carlo', options,
+                                     lambda: {'Q': self.Q, 'N': self.N, 'behavior_probs': self.behavior_probs},
+                                     stopping)
+        if buffers is not None:
+            return self.run_streaming(buffers, stopping, exploring_starts, start_state, gamma, epsilon, visit,
+                                      batch_size, save, step_size)
+
+        for episodes in self.episode_stream(lambda: self.behavior_probs, stopping, exploring_starts, start_state,
+                                            batch_size, save, batches=True):
+            with self.profiler.phase('first_visit'):
+                keys, returns = mc.batch_visits(episodes, gamma, A, visit)
+            self.profiler.count('first_visit_checks', sum(len(states) for states, _, _ in episodes))
+            with self.profiler.phase('return_accumulation'):
+                # A single first-visit episode has no repeated keys to group
+                mc.update_q(self.Q, self.N, keys, returns, step_size, unique=len(episodes) == 1 and visit == 'first')
+                self.values_from_q(self.N)
+
+            self.update_policy(epsilon)
+            stopping.update(self.Q, len(episodes))
+            self.notify('episode')
+
+        if save is not None:
+            save(final=True)
+        return self.finish(stopping)
+
+    def Monte_Carlo_Importance_Sampling(self, gamma=0.95, epsilon=0.1, n_episodes=10000, start_state=None,
+                                        batch_size=256, n_workers=1, round_size=None, seed=None, stopping=None,
+                                        estimator='weighted', checkpoint=None, max_steps=100000):
+        # The behaviour policy is fixed, so episodes are sampled in batches.
+        # estimator: 'weighted', 'ordinary' or 'per_decision' importance
+        # sampling (see mc.importance_sampling_update). Each episode is
+        # processed in bulk against the target policy current at its start;
+        # the target policy of the states it visited is improved after it.
+        # max_steps: as for Monte_Carlo.
+        if estimator not in mc.IS_ESTIMATORS:
+            raise ValueError(f"Unknown importance sampling estimator: {estimator!r}")
+        stopping = stopping or StoppingCriteria(max_episodes=n_episodes)
+        self.env.max_steps = max_steps
+        worker_seq = self.begin_run(seed)
+        self.profiler.reset()
+        if n_workers > 1:
+            if checkpoint is not None:
+                raise ValueError("Checkpointing needs n_workers=1")
+            return self.run_parallel(n_workers, stopping, False, start_state, gamma, epsilon,
+                                     importance_sampling=True, round_size=round_size, worker_seq=worker_seq,
+                                     estimator=estimator)
+
+        S, A = self.model.n_states, len(self.actions)
+        behavior_probs = np.full(A, 1.0 / A)  # Equiprobable policy
+        target_probs = self.target_policy_probs
+        self.Q = np.zeros((S, A))
+        self.C = np.zeros((S, A))  # Cumulative weights (visit counts for the unweighted estimators)
+        self.N = np.zeros((S, A), dtype=np.int64)
+        best_actions = np.zeros(S, dtype=np.int64)
+        stopping.start(self.Q)
+        restored = self.restore_run(stopping)
+        if restored is not None:
+            self.Q, self.C, self.N = restored['Q'], restored['C'], restored['N']
+            target_probs[:] = restored['target_policy_probs']
+            best_actions = restored['best_actions']
+        options = dict(gamma=gamma, epsilon=epsilon, start_state=start_state and list(start_state),
+                       batch_size=batch_size, estimator=estimator, max_steps=max_steps)
+        save = self.checkpoint_saver(checkpoint, 'Monte_Carlo_Importance_Sampling', options,
+                                     lambda: {'Q': self.Q, 'C': self.C, 'N': self.N,
+                                              'target_policy_probs': target_probs, 'best_actions': best_actions},
+                                     stopping)
+
+        for episode in self.episode_stream(behavior_probs, stopping, False, start_state, batch_size, save):
+            with self.profiler.phase('return_accumulation'):
+                touched = mc.importance_sampling_update(self.Q, self.C, self.N, episode, gamma, target_probs,
+                                                        behavior_probs, estimator)
+                self.values_from_q(self.C)
+
+            with self.profiler.phase('policy_extraction'):
+                best_actions[touched] = np.argmax(self.Q[touched], axis=1)
+                target_probs[touched] = mc.epsilon_greedy_probs(best_actions[touched], A, epsilon)
+                self.policy = self.actions_policy(best_actions)
+            stopping.update(self.Q)
+            self.notify('episode')
+
+        if save is not None:
+            save(final=True)
+        return self.finish(stopping)
+
+    def run_streaming(self, pool, stopping, exploring_starts, start_state, gamma, epsilon, visit='first',
+                      batch_size=1, save=None, step_size=None):
+        # Monte Carlo control on episodes streamed chunk by chunk through the
+        # buffers of pool: the environment fills a buffer, the returns are
+        # folded in (mc.StreamingReturns) and the buffer is recycled, so no
+        # episode is ever held whole. Q/N get the episode's returns in one
+        # update with the given step-size schedule (see mc.blend_means).
+        A = len(self.actions)
+        returns = mc.StreamingReturns(A, gamma, visit)
+        step_size = mc.as_step_size(step_size)
+
+        while stopping.reason is None:
+            if save is not None:
+                save()
+            count = stopping.remaining_episodes(batch_size)
+            starts = self.start_states(count, exploring_starts, start_state)
+            probs = self.behavior_probs
+            for start in starts.tolist():
+                chunks = self.env.stream_episode(probs, start, pool)
+                final = False
+                while not final:
+                    with self.profiler.phase('episode_generation'):
+                        buffer = next(chunks)
+                    with self.profiler.phase('return_accumulation'):
+                        returns.add(*buffer.steps())
+                    self.profiler.count('steps', buffer.length)
+                    self.profiler.count('first_visit_checks', buffer.length)
+                    final = buffer.final
+                    pool.release(buffer)
+
+                with self.profiler.phase('return_accumulation'):
+                    keys, sum_G, counts = returns.finish()
+                    mc.blend_means(self.Q, self.N, keys, sum_G / counts, counts, step_size)
+                    self.values_from_q(self.N)
+                self.profiler.count('episodes')
+
+                self.update_policy(epsilon)
+                stopping.update(self.Q)
+                self.notify('episode')
+                if stopping.reason is not None:
+                    break
+
+        if save is not None:
+            save(final=True)
+        return self.finish(stopping)
+
+    def run_parallel(self, n_workers, stopping, exploring_starts, start_state, gamma, epsilon, visit='first',
+                     importance_sampling=False, round_size=None, worker_seq=None, estimator='weighted',
+                     step_size=None):
+        # Parallel Monte Carlo control: each round of round_size episodes is
+        # sharded across n_workers processes under a fixed policy, the shard
+        # statistics are merged into Q/N (and C), exactly for sample averages
+        # and with the step_size schedule otherwise, and the policy is
+        # improved once per round. Emits a 'round' event per round; stopping
+        # criteria are checked between rounds.
+        S, A = self.model.n_states, len(self.actions)
+        round_size = round_size or 100 * n_workers
+        step_size = mc.as_step_size(step_size)
+
+        uniform = np.full(A, 1.0 / A)
+        stats = mc.MCStats.zeros(S, A)
+        stopping.start(stats.Q)
+        with ParallelMonteCarlo(self.env, n_workers, worker_seq) as pool:
+            while stopping.reason is None:
+                count = stopping.remaining_episodes(round_size)
+                starts = self.start_states(count, exploring_starts, start_state)
+
+                # Workers generate and accumulate, so both phases are timed together
+                with self.profiler.phase('episode_generation'):
+                    if importance_sampling:
+                        round_stats = pool.run_round(uniform, starts, gamma, target_probs=self.target_policy_probs,
+                                                    estimator=estimator)
+                    else:
+                        round_stats = pool.run_round(self.behavior_probs, starts, gamma, visit)
+                    if importance_sampling:
+                        stats = stats.merge(round_stats)
+                    else:
+                        keys = np.flatnonzero(round_stats.N)
+                        mc.blend_means(stats.Q, stats.N, keys, round_stats.Q.flat[keys], round_stats.N.flat[keys],
+                                       step_size)
+                self.profiler.count('episodes', count)
+
+                self.Q, self.N = stats.Q, stats.N
+                self.values_from_q(stats.weight if importance_sampling else stats.N)
+                if importance_sampling:
+                    self.C = stats.weight
+                    with self.profiler.phase('policy_extraction'):
+                        best_actions = np.argmax(self.Q, axis=1)
+                        self.target_policy_probs[:] = mc.epsilon_greedy_probs(best_actions, A, epsilon)
+                        self.policy = self.actions_policy(best_actions)
+                else:
+                    self.update_policy(epsilon)
+                stopping.update(self.Q, count)
+                self.notify('round')
+
+        return self.finish(stopping)
@@ -0,0 +1,309 @@
+import bisect
+
+import numpy as np
+
+from gridworld.model import ACTIONS
+
+
+def episode_too_long(max_steps):
+    # Episodes are never cut short: a return truncated at max_steps would be
+    # taken for a terminated one and bias Q
+    return RuntimeError(f"An episode ran {max_steps} steps without reaching a terminal; raise max_steps "
+                        "(None for no limit) or use a more exploratory policy")
+
+
+class GridWorldEnv:
+    # Samples transitions from a compiled GridModel, for the Monte Carlo solvers.
+    # States and actions are integer ids (state = i * n_cols + j, action =
+    # index into ACTIONS); get_next_state keeps the coordinate/name interface.
+    # An episode still running after max_steps steps raises RuntimeError
+    # (max_steps=None: no limit).
+    def __init__(self, model, rng=None, max_steps=100000):
+        self.model = model
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.max_steps = max_steps
+        self.on_change = None  # Called with the changed states when the layout changes (set by the engine)
+        self.successors = None  # Per-step lookup lists, built on first use (see step_tables)
+
+    def __getstate__(self):
+        # Environments are shipped to worker processes; the engine's change
+        # hook and the lookup lists stay behind
+        state = self.__dict__.copy()
+        state['on_change'] = None
+        state['successors'] = None
+        return state
+
+    def step_tables(self):
+        # The model's successor table as nested Python lists, so a step is a
+        # couple of list lookups. Only the step-by-step Monte Carlo paths need
+        # them, and at ~15x the size of the arrays they are built the first
+        # time one runs rather than with the environment.
+        if self.successors is None:
+            m = self.model
+            self.successors = m.next_states.tolist()
+            self.successor_cdf = np.cumsum(m.next_probs, axis=2).tolist()
+            self.rewards = m.R.tolist()
+            self.terminal = m.is_terminal.tolist()
+
+    def compile(self, states=None):
+        # Brings built lookup lists in line with a changed model: refreshes
+        # the rows of the affected states, or rebuilds them all when no
+        # states are given or the table changed width. Unbuilt lists stay
+        # unbuilt.
+        m = self.model
+        if self.successors is None:
+            return
+        if states is None or m.next_states.shape[2] != len(self.successors[0][0]):
+            self.successors = None
+            self.step_tables()
+            return
+        for s in np.asarray(states).tolist():
+            self.successors[s] = m.next_states[s].tolist()
+            self.successor_cdf[s] = np.cumsum(m.next_probs[s], axis=1).tolist()
+            self.rewards[s] = m.R[s].tolist()
+            self.terminal[s] = bool(m.is_terminal[s])
+
+    def apply_delta(self, **delta):
+        # Applies a small layout change (see GridModel.apply_delta), refreshes
+        # the changed rows and reports them to on_change. Returns the changed
+        # states.
+        states = self.model.apply_delta(**delta)
+        self.compile(states)
+        if self.on_change is not None:
+            self.on_change(states)
+        return states
+
+    def step(self, s, a):
+        cdf = self.successor_cdf[s][a]
+        if cdf[0] >= 1.0:
+            return self.successors[s][a][0], self.rewards[s][a]
+        k = min(bisect.bisect_right(cdf, self.rng.random() * cdf[-1]), len(cdf) - 1)
+        return self.successors[s][a][k], self.rewards[s][a]
+
+    def get_next_state(self, i, j, action):
+        self.step_tables()
+        ns, reward = self.step(self.model.state_index(i, j), ACTIONS.index(action))
+        ni, nj = self.model.state_coords(ns)
+        return ni, nj, reward
+
+    def after_step(self):
+        pass
+
+    def reset_layout(self):
+        # Undoes layout changes the environment made itself during a run
+        pass
+
+    def generate_episode(self, action_probs, start_state):
+        # action_probs is (A,) for one shared policy or (S, A) per state.
+        # Returns the episode as (states, actions, rewards) arrays.
+        self.step_tables()
+        action_probs = np.asarray(action_probs, dtype=float)
+        cdf = np.cumsum(action_probs, axis=-1).tolist()
+        shared = action_probs.ndim == 1
+        states, actions, rewards = [], [], []
+        s = int(start_state)
+
+        while not self.terminal[s]:
+            if len(states) == self.max_steps:
+                raise episode_too_long(self.max_steps)
+            row = cdf if shared else cdf[s]
+            a = min(bisect.bisect_right(row, self.rng.random() * row[-1]), len(row) - 1)
+            ns, reward = self.step(s, a)
+            states.append(s)
+            actions.append(a)
+            rewards.append(reward)
+            s = ns
+            self.after_step()
+
+        return np.array(states, dtype=np.int64), np.array(actions, dtype=np.int64), np.array(rewards, dtype=float)
+
+    def stream_episode(self, action_probs, start_state, pool):
+        # Generates one episode into fixed-size buffers taken from pool
+        # (a BufferPool), yielding each buffer as it fills up; the last one has
+        # final set. The consumer hands every buffer back with pool.release()
+        # before asking for the next, so memory stays within the pool however
+        # long the episode runs.
+        self.step_tables()
+        action_probs = np.asarray(action_probs, dtype=float)
+        cdf = np.cumsum(action_probs, axis=-1).tolist()
+        shared = action_probs.ndim == 1
+        s = int(start_state)
+        buffer = pool.acquire()
+        states, actions, rewards = buffer.states, buffer.actions, buffer.rewards
+        n = total = 0
+
+        while not self.terminal[s]:
+            if total == self.max_steps:
+                pool.release(buffer)
+                raise episode_too_long(self.max_steps)
+            if n == buffer.capacity:
+                buffer.length = n
+                yield buffer
+                buffer = pool.acquire()
+                states, actions, rewards = buffer.states, buffer.actions, buffer.rewards
+                n = 0
+            row = cdf if shared else cdf[s]
+            a = min(bisect.bisect_right(row, self.rng.random() * row[-1]), len(row) - 1)
+            ns, reward = self.step(s, a)
+            states[n] = s
+            actions[n] = a
+            rewards[n] = reward
+            n += 1
+            total += 1
+            s = ns
+            self.after_step()
+
+        buffer.length = n
+        buffer.final = True
+        yield buffer
+
+    def generate_episodes(self, action_probs, start_states):
+        # Advances every episode of the batch together: one vectorized step per
+        # time index over the episodes that have not reached a terminal yet
+        m = self.model
+        S, A = m.n_states, m.n_actions
+        action_cdf = np.cumsum(np.broadcast_to(np.asarray(action_probs, dtype=float), (S, A)), axis=1)
+        next_cdf = np.cumsum(m.next_probs, axis=2)
+
+        state = np.array(start_states, dtype=np.int64)
+        B = len(state)
+        active = np.flatnonzero(~m.is_terminal[state])
+        lengths = np.zeros(B, dtype=np.int64)
+        steps = []  # (episode ids, states, actions, rewards) per time index
+
+        t = 0
+        while len(active):
+            if t == self.max_steps:
+                raise episode_too_long(self.max_steps)
+            t += 1
+            s = state[active]
+            u = self.rng.random(len(active)) * action_cdf[s, -1]
+            a = np.minimum((u[:, None] >= action_cdf[s]).sum(axis=1), A - 1)
+            u = self.rng.random(len(active)) * next_cdf[s, a, -1]
+            k = np.minimum((u[:, None] >= next_cdf[s, a]).sum(axis=1), next_cdf.shape[2] - 1)
+            ns = m.next_states[s, a, k]
+
+            steps.append((active, s, a, m.R[s, a]))
+            lengths[active] += 1
+            state[active] = ns
+            active = active[~m.is_terminal[ns]]
+
+        if not steps:
+            empty = np.zeros(0, dtype=np.int64)
+            return EpisodeBatch(empty, empty, np.zeros(0), lengths)
+
+        # Group the steps by episode; the stable sort keeps them in time order
+        episode_ids = np.concatenate([step[0] for step in steps])
+        order = np.argsort(episode_ids, kind='stable')
+        states, actions, rewards = (np.concatenate([step[i] for step in steps])[order] for i in (1, 2, 3))
+        return EpisodeBatch(states, actions, rewards, lengths)
+
+
+class StepBuffer:
+    # A reusable chunk of up to `capacity` episode steps in typed arrays;
+    # the first `length` entries are valid
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity)
+        self.length = 0
+        self.final = False
+
+    def steps(self):
+        # (states, actions, rewards) views of the valid steps
+        n = self.length
+        return self.states[:n], self.actions[:n], self.rewards[:n]
+
+
+class BufferPool:
+    # A fixed set of StepBuffers shared by episode producers and the learner.
+    # Buffers are recycled rather than allocated, so memory is bounded by
+    # n_buffers * capacity steps; running out of free buffers is an error.
+    def __init__(self, n_buffers=2, capacity=4096):
+        self.capacity = capacity
+        self.free = [StepBuffer(capacity) for _ in range(n_buffers)]
+
+    def acquire(self):
+        if not self.free:
+            raise RuntimeError("All episode buffers are in use; release them before generating more steps")
+        buffer = self.free.pop()
+        buffer.length = 0
+        buffer.final = False
+        return buffer
+
+    def release(self, buffer):
+        self.free.append(buffer)
+
+
+class EpisodeBatch:
+    # Ragged batch of episodes: flat step arrays grouped by episode, with
+    # offsets[b]:offsets[b + 1] selecting the steps of episode b
+    def __init__(self, states, actions, rewards, lengths):
+        self.states = states
+        self.actions = actions
+        self.rewards = rewards
+        self.lengths = lengths
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def episode(self, b):
+        lo, hi = self.offsets[b], self.offsets[b + 1]
+        return self.states[lo:hi], self.actions[lo:hi], self.rewards[lo:hi]
+
+    def __iter__(self):
+        for b in range(len(self)):
+            yield self.episode(b)
+
+    def padded(self, fill=-1):
+        # (B, T) arrays padded with `fill` (states/actions) and 0 (rewards)
+        B, T = len(self), int(self.lengths.max(initial=0))
+        rows = np.repeat(np.arange(B), self.lengths)
+        cols = np.arange(len(self.states)) - self.offsets[rows]
+        states = np.full((B, T), fill, dtype=np.int64)
+        actions = np.full((B, T), fill, dtype=np.int64)
+        rewards = np.zeros((B, T))
+        states[rows, cols] = self.states
+        actions[rows, cols] = self.actions
+        rewards[rows, cols] = self.rewards
+        return states, actions, rewards
+
+    @classmethod
+    def from_episodes(cls, episodes):
+        episodes = list(episodes)
+        lengths = np.array([len(states) for states, _, _ in episodes], dtype=np.int64)
+        if not episodes:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(empty, empty, np.zeros(0), lengths)
+        states, actions, rewards = (np.concatenate([e[i] for e in episodes]) for i in range(3))
+        return cls(states.astype(np.int64), actions.astype(np.int64), rewards.astype(float), lengths)
+
+
+class SwappingGridWorldEnv(GridWorldEnv):
+    # Nonstationary variant from Part2-3: the two special cells swap places
+    # with probability swap_prob after every step
+    def __init__(self, model, cells=((0, 1), (0, 4)), swap_prob=0.1, rng=None, max_steps=100000):
+        super().__init__(model, rng, max_steps)
+        self.cells = cells
+        self.swap_prob = swap_prob
+        self.initial_teleports = {tuple(cell): model.teleports.get(tuple(cell)) for cell in cells}
+
+    def maybe_swap(self):
+        if self.rng.random() < self.swap_prob:
+            self.apply_delta(swap=self.cells)
+
+    def after_step(self):
+        self.maybe_swap()
+
+    def reset_layout(self):
+        # Swaps the special cells back to where they were when the
+        # environment was created
+        if any(self.model.teleports.get(cell) != teleport for cell, teleport in self.initial_teleports.items()):
+            self.apply_delta(teleports=self.initial_teleports)
+
+    def generate_episodes(self, action_probs, start_states):
+        # The layout can change after any step, so episodes are generated one
+        # at a time and packed into a batch
+        return EpisodeBatch.from_episodes(self.generate_episode(action_probs, start) for start in start_states)
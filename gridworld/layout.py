@@ -0,0 +1,175 @@
+import numpy as np
+
+from gridworld.model import GridModel
+
+# Layout files describe a grid world in plain text, one directive per line
+# ('#' starts a comment when it is the first character of a directive line):
+#
+#   size 5 5                      rows, cols (optional when a map is given)
+#   step_reward -0.2
+#   wall_reward -0.5
+#   terminal_reward 0
+#   map                           one row per line, up to 'end'
+#   .B..G
+#   ...#T
+#   S....
+#   ..R..
+#   T...Y
+#   end
+#   teleport B 5 R                label or i,j targets, each with an
+#   teleport G 2.5 R:0.5 Y:0.5    optional :probability (default: equal)
+#   wall 1,1 1,2                  extra cells by coordinates
+#   terminal 2,4
+#   start 0,0
+#
+# Map cells: '.' open, '#' wall, 'T' terminal, 'S' start state; any other
+# character labels an open cell so teleports can refer to it. A teleport
+# applies to every cell carrying its label; a target label must be unique.
+# Without a start state episodes start at (0, 0).
+
+OPEN, WALL, TERMINAL, START = b'.', b'#', b'T', b'S'
+REWARD_KEYS = ('step_reward', 'wall_reward', 'terminal_reward')
+
+
+def parse_cell(token, line_no):
+    try:
+        i, j = token.split(',')
+        return int(i), int(j)
+    except ValueError:
+        raise ValueError(f"line {line_no}: expected a cell 'i,j', got {token!r}") from None
+
+
+def parse_map(rows, line_no):
+    # The map as a flat uint8 array of cell codes; whitespace inside a row is
+    # ignored so small maps can be spaced out
+    rows = [''.join(row.split()) for row in rows]
+    widths = {len(row) for row in rows}
+    if len(widths) != 1 or not rows[0]:
+        raise ValueError(f"line {line_no}: map rows must be non-empty and of equal width")
+    try:
+        codes = np.frombuffer(''.join(rows).encode('ascii'), dtype=np.uint8)
+    except UnicodeEncodeError:
+        raise ValueError(f"line {line_no}: map cells must be ASCII characters") from None
+    return codes, (len(rows), widths.pop())
+
+
+def parse_layout(text):
+    # Compiles layout text straight into a GridModel. Labelled cells are kept
+    # in model.labels as {label: state ids}, e.g. for colouring special cells.
+    shape = None
+    codes = None
+    rewards = {}
+    teleports = []
+    cells = {'wall': [], 'terminal': [], 'start': []}
+
+    lines = text.splitlines()
+    n = 0
+    while n < len(lines):
+        n += 1
+        tokens = lines[n - 1].split()
+        if not tokens or tokens[0].startswith('#'):
+            continue
+        key, args = tokens[0], tokens[1:]
+        if key == 'map':
+            start = n
+            while n < len(lines) and lines[n].strip() != 'end':
+                n += 1
+            if n == len(lines):
+                raise ValueError(f"line {start}: map without 'end'")
+            codes, map_shape = parse_map(lines[start:n], start + 1)
+            n += 1
+        elif key == 'size':
+            if len(args) != 2:
+                raise ValueError(f"line {n}: expected 'size ROWS COLS'")
+            shape = (int(args[0]), int(args[1]))
+        elif key in REWARD_KEYS:
+            if len(args) != 1:
+                raise ValueError(f"line {n}: expected '{key} VALUE'")
+            rewards[key] = float(args[0])
+        elif key == 'teleport':
+            if len(args) < 3:
+                raise ValueError(f"line {n}: expected 'teleport LABEL REWARD TARGET[:PROB] ...'")
+            teleports.append((args[0], float(args[1]), args[2:], n))
+        elif key in cells:
+            cells[key].extend((parse_cell(token, n), n) for token in args)
+        else:
+            raise ValueError(f"line {n}: unknown directive {key!r}")
+
+    if codes is not None:
+        if shape is not None and shape != map_shape:
+            raise ValueError(f"size {shape} does not match the {map_shape} map")
+        shape = map_shape
+    elif shape is None:
+        raise ValueError("layout needs a 'size' or a 'map'")
+
+    walls = np.zeros(shape, dtype=bool)
+    terminals = np.zeros(shape, dtype=bool)
+    starts = np.zeros(shape, dtype=bool)
+    labels = {}
+    if codes is not None:
+        walls.flat[:] = codes == WALL[0]
+        terminals.flat[:] = codes == TERMINAL[0]
+        starts.flat[:] = codes == START[0]
+        reserved = np.frombuffer(OPEN + WALL + TERMINAL + START, dtype=np.uint8)
+        counts = np.bincount(codes, minlength=256)
+        counts[reserved] = 0
+        labels = {chr(c): np.flatnonzero(codes == c) for c in np.flatnonzero(counts)}
+
+    def inside(cell, line_no, what):
+        # An 'i,j' cell from the file, checked against the grid
+        if not (0 <= cell[0] < shape[0] and 0 <= cell[1] < shape[1]):
+            raise ValueError(f"line {line_no}: {what} cell {cell} is outside the {shape} grid")
+        return cell
+
+    for key, mask in (('wall', walls), ('terminal', terminals), ('start', starts)):
+        for cell, line_no in cells[key]:
+            mask[inside(cell, line_no, key)] = True
+    if not starts.any():
+        starts[0, 0] = True
+
+    def cell_of(token, line_no):
+        # A teleport target: an 'i,j' cell or a label on exactly one cell;
+        # never a wall
+        if ',' in token:
+            cell = inside(parse_cell(token, line_no), line_no, 'teleport target')
+        else:
+            states = labels.get(token)
+            if states is None or len(states) != 1:
+                raise ValueError(f"line {line_no}: target {token!r} must label exactly one cell")
+            cell = divmod(int(states[0]), shape[1])
+        if walls[cell]:
+            raise ValueError(f"line {line_no}: teleport target {cell} is a wall")
+        return cell
+
+    model_teleports = {}
+    for label, reward, target_tokens, line_no in teleports:
+        targets = []
+        for token in target_tokens:
+            target, _, prob = token.partition(':')
+            targets.append((cell_of(target, line_no), float(prob) if prob else None))
+        given = [prob for _, prob in targets if prob is not None]
+        for prob in given:
+            if not 0.0 <= prob <= 1.0:
+                raise ValueError(f"line {line_no}: target probability {prob} is not between 0 and 1")
+        if given and len(given) != len(targets):
+            raise ValueError(f"line {line_no}: give a probability for all targets or none")
+        if not given:
+            targets = [(cell, 1.0 / len(targets)) for cell, _ in targets]
+        elif not np.isclose(sum(given), 1.0):
+            raise ValueError(f"line {line_no}: target probabilities sum to {sum(given)}, not 1")
+
+        sources = [inside(parse_cell(label, line_no), line_no, 'teleport')] if ',' in label else \
+            [divmod(int(s), shape[1]) for s in labels.get(label, ())]
+        if not sources:
+            raise ValueError(f"line {line_no}: no cell labelled {label!r}")
+        for source in sources:
+            model_teleports[source] = (targets, reward)
+
+    model = GridModel(shape, model_teleports, terminals=terminals, walls=walls, start_states=starts, **rewards)
+    model.labels = labels
+    return model
+
+
+def load_layout(path):
+    with open(path) as f:
+        return parse_layout(f.read())
@@ -0,0 +1,375 @@
+# Monte Carlo bookkeeping shared by the engine's MC solvers. Episodes are
+# (states, actions, rewards) arrays of integer state/action ids.
+import functools
+
+import numpy as np
+
+
+def first_visit_flags(states, actions, n_actions):
+    # flags[t] is True when step t is the first occurrence of its
+    # (state, action) pair in the episode. A stable sort
+    # puts each pair's first step ahead of its repeats.
+    keys = states * n_actions + actions
+    order = np.argsort(keys, kind='stable')
+    ordered = keys[order]
+    first = np.ones(len(keys), dtype=bool)
+    np.not_equal(ordered[1:], ordered[:-1], out=first[1:])
+    flags = np.zeros(len(keys), dtype=bool)
+    flags[order[first]] = True
+    return flags
+
+
+def visit_flags(states, actions, n_actions, visit='first'):
+    if visit == 'first':
+        return first_visit_flags(states, actions, n_actions)
+    if visit == 'every':
+        return np.ones(len(states), dtype=bool)
+    raise ValueError(f"Unknown visit mode: {visit!r}")
+
+
+def greedy_actions(Q, rng):
+    # argmax over actions, breaking ties uniformly at random with a Generator
+    ties = Q >= Q.max(axis=1, keepdims=True)
+    return np.argmax(ties * rng.random(Q.shape), axis=1)
+
+
+def epsilon_greedy_probs(best_actions, n_actions, epsilon):
+    probs = np.full((len(best_actions), n_actions), epsilon / n_actions)
+    probs[np.arange(len(best_actions)), best_actions] += 1 - epsilon
+    return probs
+
+
+RETURN_BLOCK = 64
+
+
+@functools.lru_cache(maxsize=8)
+def discount_matrix(gamma):
+    # (W, tail): W[j, i] = gamma^(j - i) for j >= i (else 0) sums a block's
+    # rewards into its returns, tail[i] = gamma^(RETURN_BLOCK - i) carries
+    # the return of the next block in
+    i = np.arange(RETURN_BLOCK)
+    lag = i[:, None] - i[None, :]
+    W = np.where(lag >= 0, float(gamma) ** np.maximum(lag, 0), 0.0)
+    return W, float(gamma) ** (RETURN_BLOCK - i)
+
+
+def discounted_returns(rewards, gamma):
+    # G[t] = rewards[t] + gamma * G[t + 1]. Returns within each block of
+    # RETURN_BLOCK steps come from one matrix product. The full returns at
+    # the block starts follow the same recursion one block at a time, with
+    # discount gamma^RETURN_BLOCK, so they are computed the same way and
+    # carried into the blocks before them.
+    T = len(rewards)
+    W, tail = discount_matrix(gamma)
+    if T <= RETURN_BLOCK:
+        return np.asarray(rewards, dtype=float) @ W[:T, :T]
+    n_blocks = -(-T // RETURN_BLOCK)
+    padded = np.zeros(n_blocks * RETURN_BLOCK)
+    padded[:T] = rewards
+    G = padded.reshape(n_blocks, RETURN_BLOCK) @ W
+    starts = discounted_returns(G[:, 0], float(gamma) ** RETURN_BLOCK)
+    G[:-1] += tail * starts[1:, None]
+    return G.reshape(-1)[:T]
+
+
+class StepSize:
+    # Step-size schedule alpha_k for the k-th visit (k >= 1) of a (state,
+    # action). batch_rate gives the single step that moves Q as far as n
+    # successive updates starting after N visits: 1 - prod (1 - alpha_k) for
+    # k = N+1 .. N+n. It is exact for sample averages, and for the others when
+    # the n returns are equal; otherwise Q moves towards their mean.
+    def rate(self, k):
+        raise NotImplementedError
+
+    def batch_rate(self, N, n):
+        k = np.repeat(N, n) + 1 + (np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n))
+        return 1.0 - np.multiply.reduceat(1.0 - self.rate(k), np.cumsum(n) - n)
+
+
+class SampleAverage(StepSize):
+    # alpha_k = 1 / k: Q is the plain mean of the returns
+    def rate(self, k):
+        return 1.0 / k
+
+    def batch_rate(self, N, n):
+        return n / (N + n)
+
+
+class ConstantStepSize(StepSize):
+    # alpha_k = alpha: a recency-weighted average that keeps tracking a
+    # changing environment
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+
+    def rate(self, k):
+        return np.full(np.shape(k), self.alpha)
+
+    def batch_rate(self, N, n):
+        return 1.0 - (1.0 - self.alpha) ** n
+
+
+class PolynomialStepSize(StepSize):
+    # alpha_k = k^-power; power in (0.5, 1] meets the Robbins-Monro conditions
+    def __init__(self, power=0.7):
+        self.power = power
+
+    def rate(self, k):
+        return np.asarray(k, dtype=float) ** -self.power
+
+
+def as_step_size(step_size):
+    # None or 'sample_average', a float (constant alpha), 'polynomial' or
+    # ('polynomial', power), or a StepSize
+    if step_size is None or step_size == 'sample_average':
+        return SampleAverage()
+    if isinstance(step_size, StepSize):
+        return step_size
+    if step_size == 'polynomial':
+        return PolynomialStepSize()
+    if isinstance(step_size, (tuple, list)) and len(step_size) == 2 and step_size[0] == 'polynomial':
+        return PolynomialStepSize(step_size[1])
+    if isinstance(step_size, (int, float)):
+        return ConstantStepSize(float(step_size))
+    raise ValueError(f"Unknown step size: {step_size!r}")
+
+
+def step_size_spec(step_size):
+    # The JSON-able form of a StepSize that as_step_size turns back into it
+    if isinstance(step_size, ConstantStepSize):
+        return step_size.alpha
+    if isinstance(step_size, PolynomialStepSize):
+        return ['polynomial', step_size.power]
+    if isinstance(step_size, SampleAverage):
+        return None
+    raise ValueError(f"Step size {step_size!r} cannot be saved")
+
+
+def blend_means(Q, N, keys, means, counts, step_size):
+    # Moves Q towards the mean of `counts` new returns for each flat
+    # (state, action) key, with the batch rate of step_size, and counts the
+    # visits in N
+    Q, N = Q.reshape(-1), N.reshape(-1)
+    Q[keys] += step_size.batch_rate(N[keys], counts) * (means - Q[keys])
+    N[keys] += counts
+
+
+def update_q(Q, N, keys, returns, step_size, unique=False):
+    # One scatter pass over a batch of visits: flat (state, action) keys and
+    # their returns, in any order. unique=True skips the grouping when no key
+    # repeats, e.g. the first visits of a single episode. Returns the updated
+    # keys.
+    if unique:
+        blend_means(Q, N, keys, returns, np.ones(len(keys), dtype=np.int64), step_size)
+        return keys
+    keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    blend_means(Q, N, keys, np.bincount(inverse, returns) / counts, counts, step_size)
+    return keys
+
+
+def episode_visits(states, actions, rewards, gamma, n_actions, visit='first'):
+    # Flat (state, action) keys and returns of the visits to update in one
+    # episode; first visits have no repeated keys
+    update = visit_flags(states, actions, n_actions, visit)
+    return (states * n_actions + actions)[update], discounted_returns(rewards, gamma)[update]
+
+
+def batch_visits(episodes, gamma, n_actions, visit='first'):
+    # Flat (state, action) keys and returns of every visit to update in a
+    # batch of episodes
+    visits = [episode_visits(states, actions, rewards, gamma, n_actions, visit)
+              for states, actions, rewards in episodes]
+    if not visits:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    if len(visits) == 1:
+        return visits[0]
+    keys, returns = zip(*visits)
+    return np.concatenate(keys), np.concatenate(returns)
+
+
+class StreamingReturns:
+    # Discounted returns of an episode that arrives in chunks (see
+    # GridWorldEnv.stream_episode), summed per (state, action) without ever
+    # holding the whole episode. Each chunk is walked backwards once; a visit
+    # at step t is kept as G_t = a + b * G_end (a: its return within the
+    # chunk, b = gamma^(steps to the chunk end)), and the pending (a, b) sums
+    # are carried over the start of every later chunk. Memory grows with the
+    # number of distinct (state, action) pairs visited, not with the length.
+    def __init__(self, n_actions, gamma, visit='first'):
+        if visit not in ('first', 'every'):
+            raise ValueError(f"Unknown visit mode: {visit!r}")
+        self.n_actions = n_actions
+        self.gamma = gamma
+        self.visit = visit
+        self.reset()
+
+    def reset(self):
+        self.keys = np.zeros(0, dtype=np.int64)  # Sorted (state, action) keys visited so far
+        self.a = np.zeros(0)
+        self.b = np.zeros(0)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, states, actions, rewards):
+        # Appends the next chunk of the episode (in time order)
+        L = len(states)
+        if L == 0:
+            return
+        G = discounted_returns(rewards, self.gamma)
+        self.a += self.b * G[0]
+        self.b *= self.gamma ** L
+
+        keys = states * self.n_actions + actions
+        if self.visit == 'first':
+            flags = first_visit_flags(states, actions, self.n_actions)
+            flags[np.isin(keys, self.keys)] = False
+            keys, G, t = keys[flags], G[flags], np.flatnonzero(flags)
+        else:
+            t = np.arange(L)
+        new_keys, inverse = np.unique(keys, return_inverse=True)
+        chunk_a = np.bincount(inverse, G)
+        chunk_b = np.bincount(inverse, self.gamma ** (L - t))
+        chunk_counts = np.bincount(inverse)
+
+        merged = np.union1d(self.keys, new_keys)
+        a, b = np.zeros(len(merged)), np.zeros(len(merged))
+        counts = np.zeros(len(merged), dtype=np.int64)
+        old = np.searchsorted(merged, self.keys)
+        a[old], b[old], counts[old] = self.a, self.b, self.counts
+        new = np.searchsorted(merged, new_keys)
+        a[new] += chunk_a
+        b[new] += chunk_b
+        counts[new] += chunk_counts
+        self.keys, self.a, self.b, self.counts = merged, a, b, counts
+
+    def finish(self):
+        # The episode ended (G_end = 0): returns (keys, summed returns, visit
+        # counts) and starts a new episode
+        result = self.keys, self.a, self.counts
+        self.reset()
+        return result
+
+
+class MCStats:
+    # Mergeable Monte Carlo statistics. Q is the weighted mean return of each
+    # (state, action), weight its total weight (visit count for on-policy MC,
+    # cumulative importance weight C for weighted importance sampling) and N
+    # the number of visits. Merging two shards gives exactly the statistics of
+    # their combined episodes.
+    def __init__(self, Q, weight, N):
+        self.Q = Q
+        self.weight = weight
+        self.N = N
+
+    @classmethod
+    def zeros(cls, n_states, n_actions):
+        return cls(np.zeros((n_states, n_actions)), np.zeros((n_states, n_actions)),
+                   np.zeros((n_states, n_actions), dtype=np.int64))
+
+    def merge(self, other):
+        weight = self.weight + other.weight
+        with np.errstate(invalid='ignore', divide='ignore'):
+            Q = np.where(weight > 0, (self.weight * self.Q + other.weight * other.Q) / weight, 0.0)
+        return MCStats(Q, weight, self.N + other.N)
+
+    def state_values(self):
+        # Weight-averaged Q over the actions tried in each state
+        total = self.weight.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total > 0, (self.weight * self.Q).sum(axis=1) / total, 0.0)
+
+
+def accumulate_returns(batch, gamma, n_states, n_actions, visit='first'):
+    # Sample-average returns of an EpisodeBatch generated by one fixed policy
+    keys, returns = batch_visits(batch, gamma, n_actions, visit)
+    sum_G = np.bincount(keys, returns, minlength=n_states * n_actions)
+    N = np.bincount(keys, minlength=n_states * n_actions)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        Q = np.where(N > 0, sum_G / N, 0.0)
+    shape = (n_states, n_actions)
+    return MCStats(Q.reshape(shape), N.reshape(shape).astype(float), N.reshape(shape))
+
+
+IS_ESTIMATORS = ('weighted', 'ordinary', 'per_decision')
+
+
+def importance_weights(states, actions, target_probs, behavior_probs):
+    # Weights of the returns of an episode generated by behavior_probs (A,):
+    # W[t] = prod_{k > t} target(a_k | s_k) / behavior(a_k), a backwards
+    # cumulative product of the per-step ratios. Steps before the last zero
+    # ratio have zero weight and are cut off: returns (first, W, ratios) with
+    # W covering steps first.. only.
+    ratios = target_probs[states, actions] / behavior_probs[actions]
+    zeros = np.flatnonzero(ratios == 0)
+    first = int(zeros[-1]) if zeros.size else 0
+    W = np.ones(len(states) - first)
+    W[:-1] = np.cumprod(ratios[:first:-1])[::-1]
+    return first, W, ratios
+
+
+def per_decision_returns(rewards, ratios, gamma):
+    # G[t] = rewards[t] + gamma * ratios[t + 1] * G[t + 1]: every reward is
+    # weighted by the ratios of the decisions before it only. The step
+    # discounts vary, so instead of discounted_returns' fixed block matrix
+    # this is a doubling scan: after the pass with shift k, G[t] holds the
+    # return of steps t .. t + 2k - 1 and link[t] the product of discounts
+    # reaching step t + 2k, so log2(T) vectorized passes cover the episode.
+    # A zero ratio zeroes every link across it, which stops the returns
+    # before it there; the scan ends early once no link is left.
+    T = len(rewards)
+    G = np.array(rewards, dtype=float)
+    link = np.zeros(T)
+    link[:-1] = gamma * np.asarray(ratios[1:], dtype=float)
+    k = 1
+    while k < T and link.any():
+        G[:-k] += link[:-k] * G[k:]
+        link[:-k] *= link[k:]
+        link[-k:] = 0.0
+        k *= 2
+    return G
+
+
+def importance_sampling_update(Q, weight, N, episode, gamma, target_probs, behavior_probs, estimator='weighted'):
+    # Off-policy update of Q (S, A) from one episode, in bulk:
+    #   'weighted'      Q = sum(W G) / sum(W), weight is C = sum(W)
+    #   'ordinary'      Q = sum(W G) / visits, weight is the visit count
+    #   'per_decision'  Q = mean per-decision return, weight is the visit count
+    # Same result as the step-by-step incremental updates for a target policy
+    # fixed over the episode. N counts the visits. Returns the updated states.
+    states, actions, rewards = episode
+    n_actions = Q.shape[1]
+    if estimator == 'per_decision':
+        ratios = target_probs[states, actions] / behavior_probs[actions]
+        G = per_decision_returns(rewards, ratios, gamma)
+        W = np.ones(len(states))
+    elif estimator in ('weighted', 'ordinary'):
+        first, W, _ = importance_weights(states, actions, target_probs, behavior_probs)
+        G = discounted_returns(rewards[first:], gamma)
+        if estimator == 'weighted':
+            states, actions = states[first:], actions[first:]  # Zero weights add nothing
+        else:
+            # Zero-weight visits still count towards the ordinary average
+            W = np.concatenate([np.zeros(first), W])
+            G = np.concatenate([np.zeros(first), G])
+    else:
+        raise ValueError(f"Unknown importance sampling estimator: {estimator!r}")
+
+    keys, inverse, visits = np.unique(states * n_actions + actions, return_inverse=True, return_counts=True)
+    sum_WG = np.bincount(inverse, W * G)
+    added = np.bincount(inverse, W) if estimator == 'weighted' else visits
+    Q, weight, N = Q.reshape(-1), weight.reshape(-1), N.reshape(-1)
+    total = weight[keys] + added
+    with np.errstate(invalid='ignore', divide='ignore'):
+        Q[keys] = np.where(total > 0, (weight[keys] * Q[keys] + sum_WG) / total, Q[keys])
+    weight[keys] = total
+    N[keys] += visits
+    return np.unique(keys // n_actions)
+
+
+def accumulate_weighted_returns(batch, gamma, target_probs, behavior_probs, estimator='weighted'):
+    # Importance sampling of an EpisodeBatch generated by behavior_probs (A,),
+    # for a fixed target policy target_probs (S, A)
+    n_states, n_actions = target_probs.shape
+    stats = MCStats.zeros(n_states, n_actions)
+    for episode in batch:
+        importance_sampling_update(stats.Q, stats.weight, stats.N, episode, gamma, target_probs, behavior_probs,
+                                   estimator)
+    return stats
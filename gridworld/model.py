@@ -0,0 +1,244 @@
+import numpy as np
+
+ACTIONS = ['up', 'down', 'left', 'right']
+ACTION_DELTAS = np.array([(-1, 0), (1, 0), (0, -1), (0, 1)])
+
+
+def cell_mask(cells, shape):
+    # Flat boolean mask over the states from a list of (i, j) cells or a
+    # boolean (rows, cols) array
+    cells = np.asarray(cells)
+    if cells.dtype == bool:
+        if cells.shape != tuple(shape):
+            raise ValueError(f"Cell mask has shape {cells.shape}, expected {tuple(shape)}")
+        return cells.reshape(-1).copy()
+    mask = np.zeros(shape, dtype=bool)
+    if cells.size:
+        cells = cells.reshape(-1, 2)
+        mask[cells[:, 0], cells[:, 1]] = True
+    return mask.reshape(-1)
+
+
+class GridModel:
+    # Compiled GridWorld dynamics, built once from the grid layout: R[s, a]
+    # expected rewards and a fixed-width successor table, where action a in
+    # state s leads to next_states[s, a, k] with probability next_probs[s, a, k].
+    # Every (state, action) has at most K successors (K = 2 with the green
+    # cell), so memory is linear in the number of cells. The dense P[s, a, s']
+    # tensor is only materialized on request.
+    # teleports maps a cell to ([(target, prob), ...], reward); any action taken
+    # there moves the agent to one of the targets.
+    # grid_size is n for an n x n grid or (rows, cols). terminals, walls and
+    # start_states are lists of cells or boolean (rows, cols) masks. Moving
+    # into a wall bounces like leaving the grid; wall cells are never entered
+    # and are treated as terminal.
+    def __init__(self, grid_size, teleports=None, step_reward=0.0, wall_reward=-0.5,
+                 terminals=(), terminal_reward=0.0, walls=(), start_states=((0, 0),)):
+        self.grid_size = grid_size
+        self.shape = (grid_size, grid_size) if np.isscalar(grid_size) else tuple(grid_size)
+        self.n_rows, self.n_cols = self.shape
+        self.n_states = self.n_rows * self.n_cols
+        self.n_actions = len(ACTIONS)
+        self.teleports = dict(teleports or {})
+        self.step_reward = step_reward
+        self.wall_reward = wall_reward  # Reward for trying to leave the grid or enter a wall
+        self.terminals = terminals
+        self.terminal_reward = terminal_reward  # Reward for stepping into a terminal
+        self.walls = walls
+        self.start_states = np.flatnonzero(cell_mask(start_states, self.shape))  # State ids
+        self.labels = {}  # Named cells of a layout file, {label: state ids}
+
+        self.build()
+
+    def state_index(self, i, j):
+        return i * self.n_cols + j
+
+    def state_coords(self, s):
+        return divmod(int(s), self.n_cols)
+
+    def build(self):
+        n_rows, n_cols = self.shape
+        S, A = self.n_states, self.n_actions
+        states = np.arange(S, dtype=np.int32)
+        ids = states.reshape(n_rows, n_cols)
+
+        # blocked[i, j, a]: the move leaves the grid or runs into a wall. Each
+        # action is a shifted slice of the wall mask, so no per-cell indexing.
+        self.is_wall = cell_mask(self.walls, self.shape)
+        wall = self.is_wall.reshape(self.shape)
+        blocked = np.ones((n_rows, n_cols, A), dtype=bool)
+        for a, (di, dj) in enumerate(ACTION_DELTAS):
+            src = (slice(max(-di, 0), n_rows - max(di, 0)), slice(max(-dj, 0), n_cols - max(dj, 0)))
+            dst = (slice(max(di, 0), n_rows + min(di, 0)), slice(max(dj, 0), n_cols + min(dj, 0)))
+            blocked[src + (a,)] = wall[dst]
+        offsets = (ACTION_DELTAS @ np.array([n_cols, 1])).astype(np.int32)
+        next_state = (ids[:, :, None] + np.where(blocked, 0, offsets)).reshape(S, A)
+        blocked = blocked.reshape(S, A)
+
+        self.is_terminal = cell_mask(self.terminals, self.shape) | self.is_wall
+
+        R = np.where(blocked, self.wall_reward, self.step_reward)
+        if self.is_terminal.any():
+            R[~blocked & self.is_terminal[next_state]] = self.terminal_reward
+
+        # Successor table: next_states[s, a, k] is reached with next_probs[s, a, k].
+        # K is the largest number of successors of any (state, action).
+        K = max([1] + [len(targets) for targets, _ in self.teleports.values()])
+        if K == 1:
+            next_states = next_state[:, :, None]
+            next_probs = np.ones((S, A, 1))
+        else:
+            next_states = np.repeat(next_state[:, :, None], K, axis=2)
+            next_probs = np.zeros((S, A, K))
+            next_probs[:, :, 0] = 1.0
+
+        self.next_states = next_states
+        self.next_probs = next_probs
+        self.R = np.asarray(R, dtype=float)
+        self._P = None
+        self.index_teleports()
+        self.set_special_rows()
+
+    def set_special_rows(self, states=None):
+        # Teleport rows, then terminals: absorbing with zero reward. states
+        # (sorted) limits this to those rows; None sets every row, taking the
+        # terminals straight from the is_terminal mask.
+        teleports = self.teleport_states if states is None else np.intersect1d(states, self.teleport_states)
+        for s in teleports.tolist():
+            targets, reward = self.teleports[self.state_coords(s)]
+            self.next_states[s] = s
+            self.next_probs[s] = 0.0
+            for k, (target, prob) in enumerate(targets):
+                self.next_states[s, :, k] = self.state_index(*target)
+                self.next_probs[s, :, k] = prob
+            self.R[s] = reward
+        terminal = np.flatnonzero(self.is_terminal) if states is None else states[self.is_terminal[states]]
+        self.next_states[terminal] = terminal[:, None, None]
+        self.next_probs[terminal] = 0.0
+        self.next_probs[terminal, :, 0] = 1.0
+        self.R[terminal] = 0.0
+
+    def rebuild_rows(self, states):
+        # Recompute the successor rows of the given states only
+        states = np.unique(np.asarray(states, dtype=np.int64))
+        rows, cols = np.divmod(states, self.n_cols)
+        ni = rows[:, None] + ACTION_DELTAS[:, 0]
+        nj = cols[:, None] + ACTION_DELTAS[:, 1]
+        off_grid = (ni < 0) | (ni >= self.n_rows) | (nj < 0) | (nj >= self.n_cols)
+        next_state = np.where(off_grid, states[:, None], ni * self.n_cols + nj)
+        blocked = off_grid | self.is_wall[next_state]
+        next_state = np.where(blocked, states[:, None], next_state)
+
+        R = np.where(blocked, self.wall_reward, self.step_reward)
+        R[~blocked & self.is_terminal[next_state]] = self.terminal_reward
+        self.next_states[states] = next_state[:, :, None]
+        self.next_probs[states] = 0.0
+        self.next_probs[states, :, 0] = 1.0
+        self.R[states] = R
+        self._P = None
+        self.set_special_rows(states)
+        return states
+
+    def neighbours(self, states):
+        # The states themselves and their in-grid 4-neighbours
+        states = np.atleast_1d(np.asarray(states, dtype=np.int64))
+        rows, cols = np.divmod(states, self.n_cols)
+        ni = (rows[:, None] + ACTION_DELTAS[:, 0]).ravel()
+        nj = (cols[:, None] + ACTION_DELTAS[:, 1]).ravel()
+        inside = (ni >= 0) & (ni < self.n_rows) & (nj >= 0) & (nj < self.n_cols)
+        return np.union1d(states, ni[inside] * self.n_cols + nj[inside])
+
+    def predecessors(self, states):
+        # Every state that may have a transition into one of `states`: grid
+        # moves only come from neighbours, plus the teleports targeting them.
+        # A superset is fine for propagating value changes.
+        states = np.atleast_1d(np.asarray(states, dtype=np.int64))
+        sources = [p for s in states.tolist() for p in self.teleport_sources.get(s, ())]
+        return np.union1d(self.neighbours(states), np.array(sources, dtype=np.int64))
+
+    def index_teleports(self):
+        # Teleport source states, and target state -> source states
+        self.teleport_states = np.array(sorted(self.state_index(*cell) for cell in self.teleports), dtype=np.int64)
+        self.teleport_sources = {}
+        for cell, (targets, _) in self.teleports.items():
+            for target, prob in targets:
+                if prob > 0:
+                    self.teleport_sources.setdefault(self.state_index(*target), []).append(self.state_index(*cell))
+
+    def apply_delta(self, swap=None, teleports=None, terminals=None):
+        # Small layout change without a full rebuild: swap=(p, q) swaps the
+        # special-cell behaviour of two cells, teleports={cell: (targets,
+        # reward) or None} sets or removes teleports, terminals={cell: bool}
+        # adds or removes terminals. Returns the states whose rows changed.
+        changed = []
+        if swap is not None:
+            p, q = tuple(swap[0]), tuple(swap[1])
+            tp, tq = self.teleports.pop(p, None), self.teleports.pop(q, None)
+            if tp is not None:
+                self.teleports[q] = tp
+            if tq is not None:
+                self.teleports[p] = tq
+            changed += [self.state_index(*p), self.state_index(*q)]
+        for cell, teleport in (teleports or {}).items():
+            cell = tuple(cell)
+            if teleport is None:
+                self.teleports.pop(cell, None)
+            else:
+                self.teleports[cell] = teleport
+            changed.append(self.state_index(*cell))
+        if terminals:
+            is_terminal = self.is_terminal.reshape(self.shape)
+            for cell, terminal in terminals.items():
+                is_terminal[tuple(cell)] = terminal
+                # Entering a terminal is rewarded differently, so neighbours change too
+                changed.extend(self.neighbours(self.state_index(*cell)).tolist())
+            self.terminals = (self.is_terminal & ~self.is_wall).reshape(self.shape)
+
+        self.index_teleports()
+        K = max([1] + [len(targets) for targets, _ in self.teleports.values()])
+        if K > self.next_states.shape[2]:
+            self.build()  # The successor table has to grow
+            return np.arange(self.n_states)
+        return self.rebuild_rows(changed)
+
+    @property
+    def P(self):
+        # Dense (S, A, S) transition tensor, built on first use. Only practical
+        # for small grids; the solvers work on the successor table.
+        if self._P is None:
+            S, A, _ = self.next_states.shape
+            P = np.zeros((S, A, S))
+            np.add.at(P, (np.arange(S)[:, None, None], np.arange(A)[None, :, None], self.next_states),
+                      self.next_probs)
+            self._P = P
+        return self._P
+
+    def __getstate__(self):
+        # Never ship a cached dense tensor to worker processes
+        state = self.__dict__.copy()
+        state['_P'] = None
+        return state
+
+    def expected_next_values(self, V):
+        # (S, A) array of sum_s' P[s, a, s'] V[s'], straight from the successor table
+        return (self.next_probs * V[self.next_states]).sum(axis=2)
+
+
+def part1_model():
+    # Layout used by Part1-*: blue (0, 1) jumps to red (3, 2), green (0, 4)
+    # jumps to red or yellow (4, 4) with equal probability, no terminals.
+    teleports = {
+        (0, 1): ([((3, 2), 1.0)], 5.0),
+        (0, 4): ([((3, 2), 0.5), ((4, 4), 0.5)], 2.5),
+    }
+    return GridModel(5, teleports)
+
+
+def part2_model(blue_pos=(0, 1), green_pos=(0, 4), blue_target=(3, 2), terminals=((2, 4), (4, 0))):
+    # Layout used by Part2-*: -0.2 step cost, green jumps to red (4, 2) or
+    # yellow (4, 4), black terminals at (2, 4) and (4, 0).
+    teleports = {
+        blue_pos: ([(blue_target, 1.0)], 5.0),
+        green_pos: ([((4, 2), 0.5), ((4, 4), 0.5)], 2.5),
+    }
+    return GridModel(5, teleports, step_reward=-0.2, terminals=terminals)
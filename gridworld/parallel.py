@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from gridworld import mc
+
+_env = None  # Per-process copy of the environment
+
+
+def _init_worker(env):
+    global _env
+    _env = env
+
+
+def _run_shard(seed, behavior_probs, start_states, gamma, visit, target_probs, estimator):
+    _env.rng = np.random.default_rng(seed)
+    batch = _env.generate_episodes(behavior_probs, start_states)
+    if target_probs is None:
+        return mc.accumulate_returns(batch, gamma, _env.model.n_states, _env.model.n_actions, visit)
+    return mc.accumulate_weighted_returns(batch, gamma, target_probs, behavior_probs, estimator)
+
+
+class ParallelMonteCarlo:
+    # Shards Monte Carlo episode generation and return accumulation across
+    # worker processes. Each round every worker samples its share of episodes
+    # from the same fixed policy with its own child RNG stream (spawned from
+    # one SeedSequence, so a run is reproducible for a given seed and worker
+    # count), and the shard statistics are merged exactly in shard order.
+    def __init__(self, env, n_workers, seed=None):
+        self.n_workers = n_workers
+        self.seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.executor = ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=(env,))
+
+    def run_round(self, behavior_probs, start_states, gamma, visit='first', target_probs=None, estimator='weighted'):
+        # target_probs=None: sample-average returns of behavior_probs;
+        # otherwise importance sampling towards target_probs (S, A) with the
+        # given estimator (see mc.importance_sampling_update)
+        seeds = self.seed_seq.spawn(self.n_workers)
+        shards = np.array_split(np.asarray(start_states), self.n_workers)
+        futures = [self.executor.submit(_run_shard, seed, behavior_probs, shard, gamma, visit, target_probs,
+                                        estimator)
+                   for seed, shard in zip(seeds, shards) if len(shard)]
+
+        stats = None
+        for future in futures:
+            shard_stats = future.result()
+            stats = shard_stats if stats is None else stats.merge(shard_stats)
+        return stats
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,76 @@
+import numpy as np
+
+from gridworld.dp import greedy_mask
+from gridworld.model import ACTIONS
+
+LETTERS = [a[0].upper() for a in ACTIONS]
+# Display label of every tie bitmask: bit a set -> action a is optimal
+LABELS = np.array([', '.join(LETTERS[a] for a in range(len(ACTIONS)) if bits >> a & 1)
+                   for bits in range(1 << len(ACTIONS))], dtype=object)
+ACTION_BITS = (1 << np.arange(len(ACTIONS))).astype(np.uint8)
+
+
+class Policy:
+    # A greedy policy as two flat arrays: actions (S,) int8, the first optimal
+    # action or -1 where there is none (terminals), and ties (S,) uint8, a
+    # bitmask of every optimal action. Comparing policies compares the masks;
+    # 'U' / 'D, R' labels are only built for display, by labels() or
+    # indexing with a cell: policy[i, j].
+    def __init__(self, actions, ties, shape):
+        self.actions = np.asarray(actions, dtype=np.int8)
+        self.ties = np.asarray(ties, dtype=np.uint8)
+        self.shape = tuple(shape)
+        self._labels = None
+
+    @classmethod
+    def empty(cls, shape):
+        S = int(np.prod(shape))
+        return cls(np.full(S, -1), np.zeros(S), shape)
+
+    @classmethod
+    def from_mask(cls, mask, shape):
+        # From an (S, A) boolean mask of optimal actions (see dp.greedy_mask)
+        ties = mask @ ACTION_BITS.astype(np.int64)
+        actions = np.where(ties > 0, np.argmax(mask, axis=1), -1)
+        return cls(actions, ties, shape)
+
+    @classmethod
+    def from_q(cls, q, shape, terminal=None):
+        # Every maximizing action of each non-terminal state of a Q table
+        mask = greedy_mask(q)
+        if terminal is not None:
+            mask[terminal] = False
+        return cls.from_mask(mask, shape)
+
+    @classmethod
+    def from_actions(cls, actions, shape, terminal=None):
+        # From (S,) single greedy actions; terminal states get no action
+        actions = np.asarray(actions).astype(np.int8)
+        if terminal is not None:
+            actions = np.where(terminal, np.int8(-1), actions)
+        ties = np.where(actions >= 0, ACTION_BITS[np.maximum(actions, 0)], 0)
+        return cls(actions, ties, shape)
+
+    def mask(self):
+        # (S, A) boolean mask of the optimal actions
+        return (self.ties[:, None] & ACTION_BITS) > 0
+
+    def __eq__(self, other):
+        if not isinstance(other, Policy):
+            return NotImplemented
+        return self.shape == other.shape and np.array_equal(self.ties, other.ties)
+
+    __hash__ = None
+
+    def changed(self, other):
+        # Flat ids of the states whose optimal actions differ
+        return np.flatnonzero(self.ties != other.ties)
+
+    def labels(self):
+        # (rows, cols) object array of display labels, built once
+        if self._labels is None:
+            self._labels = LABELS[self.ties].reshape(self.shape)
+        return self._labels
+
+    def __getitem__(self, cell):
+        return self.labels()[cell]
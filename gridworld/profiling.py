@@ -0,0 +1,64 @@
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+_DISABLED = nullcontext()
+
+
+class Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.times[self.name] += time.perf_counter() - self.start
+        self.profiler.calls[self.name] += 1
+        return False
+
+
+class Profiler:
+    # Wall time per phase and event counters for the solvers. Phases are
+    # timed around whole sweeps, episodes or batches, never single steps, so
+    # enabling it costs little; when disabled a phase is a shared no-op
+    # context and a count is one attribute check.
+    #
+    # Phases: 'backups', 'linear_solves', 'policy_extraction',
+    # 'episode_generation' (includes the per-step transition lookups),
+    # 'first_visit', 'return_accumulation', 'observers' (progress callbacks),
+    # 'redraw' (a GridRenderer frame, nested in 'observers') and
+    # 'checkpoints'. Counters: 'sweeps', 'backups', 'rounds', 'episodes',
+    # 'steps', 'first_visit_checks', 'redraws', 'checkpoints'.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counts = defaultdict(int)
+
+    def phase(self, name):
+        if not self.enabled:
+            return _DISABLED
+        return Phase(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counts[name] += n
+
+    def snapshot(self):
+        # Plain dicts, safe to keep or serialize after the next reset
+        return {
+            'times': dict(self.times),
+            'calls': dict(self.calls),
+            'counts': dict(self.counts),
+        }
+
+    def report(self):
+        lines = [f"{name:<20} {self.times[name]:9.4f}s {self.calls[name]:>9} calls" for name in self.times]
+        lines += [f"{name:<20} {count:>20}" for name, count in self.counts.items()]
+        return "\n".join(lines)
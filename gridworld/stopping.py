@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+
+
+class StoppingCriteria:
+    # Stopping rules for Monte Carlo runs; the run ends on whichever fires
+    # first and the reason is reported:
+    #   'max_episodes'  - episode budget used up
+    #   'max_seconds'   - wall-clock budget used up
+    #   'policy_stable' - greedy policy unchanged for stable_windows windows
+    #   'q_converged'   - max |dQ| over one window below q_tol
+    # The policy and Q checks run once every `window` episodes; each check
+    # appends (episodes, max |dQ| over the window) to self.history.
+    def __init__(self, max_episodes=10000, max_seconds=None, stable_windows=None, q_tol=None, window=100):
+        if max_episodes is None and max_seconds is None and stable_windows is None and q_tol is None:
+            raise ValueError("At least one stopping criterion is required")
+        self.max_episodes = max_episodes
+        self.max_seconds = max_seconds
+        self.stable_windows = stable_windows
+        self.q_tol = q_tol
+        self.window = window
+
+    def start(self, Q):
+        self.start_time = time.perf_counter()
+        self.episodes = 0
+        self.next_check = self.window
+        self.last_Q = Q.copy()
+        self.last_greedy = np.argmax(Q, axis=1)
+        self.stable_count = 0
+        self.reason = None
+        self.history = []
+
+    def remaining_episodes(self, default):
+        if self.max_episodes is None:
+            return default
+        return min(default, self.max_episodes - self.episodes)
+
+    def update(self, Q, n_episodes=1):
+        # Record n_episodes more episodes; returns the stop reason or None
+        self.episodes += n_episodes
+        if self.max_episodes is not None and self.episodes >= self.max_episodes:
+            self.reason = 'max_episodes'
+        elif self.max_seconds is not None and time.perf_counter() - self.start_time >= self.max_seconds:
+            self.reason = 'max_seconds'
+        elif self.episodes >= self.next_check:
+            self.next_check = self.episodes + self.window
+            self.reason = self.check_window(Q)
+        return self.reason
+
+    def check_window(self, Q):
+        delta = float(np.max(np.abs(Q - self.last_Q)))
+        self.last_Q = Q.copy()
+        self.history.append((self.episodes, delta))
+        if self.q_tol is not None and delta < self.q_tol:
+            return 'q_converged'
+
+        if self.stable_windows is not None:
+            greedy = np.argmax(Q, axis=1)
+            self.stable_count = self.stable_count + 1 if np.array_equal(greedy, self.last_greedy) else 0
+            self.last_greedy = greedy
+            if self.stable_count >= self.stable_windows:
+                return 'policy_stable'
+        return None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def config(self):
+        return {key: getattr(self, key) for key in ('max_episodes', 'max_seconds', 'stable_windows', 'q_tol', 'window')}
+
+    def get_state(self):
+        # (arrays, JSON-able dict) for a checkpoint; the elapsed time is kept
+        # so max_seconds counts the time before a resume
+        state = {'config': self.config(), 'episodes': self.episodes, 'next_check': self.next_check,
+                 'stable_count': self.stable_count, 'elapsed': self.elapsed(), 'reason': self.reason}
+        arrays = {'last_Q': self.last_Q, 'last_greedy': self.last_greedy,
+                  'history': np.array(self.history, dtype=float).reshape(-1, 2)}
+        return arrays, state
+
+    def set_state(self, arrays, state):
+        self.start_time = time.perf_counter() - state['elapsed']
+        self.episodes = state['episodes']
+        self.next_check = state['next_check']
+        self.stable_count = state['stable_count']
+        self.last_Q = arrays['last_Q'].copy()
+        self.last_greedy = arrays['last_greedy'].copy()
+        self.history = [(int(episodes), delta) for episodes, delta in arrays['history'].tolist()]
+        # A finished run stays finished unless the criteria were changed
+        self.reason = state['reason'] if self.config() == state['config'] else None
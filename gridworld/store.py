@@ -0,0 +1,186 @@
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+
+from gridworld.policy import Policy
+
+try:  # Optional: POSIX file locks keep concurrent index appends whole
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Append-only result store for solved runs, one directory:
+#
+#   index.jsonl                    one JSON line per run
+#   segments/<segment>/<column>.npy
+#
+# Every append writes a new segment: one .npy file per column holding the
+# arrays of all the runs in the append, flattened and concatenated. The
+# segment is built in a temporary directory and renamed into place, then
+# its runs are added to the index with one appended write, so writers in
+# different processes never touch the same file and readers never see a
+# partial segment. An index line gives the run's metadata and, per column,
+# the [start, stop) range of its flattened array and its shape. Columns are
+# opened as memory maps on first use, so runs are read lazily.
+
+COLUMNS = ('values', 'q', 'policy_actions', 'policy_ties', 'curve')
+INDEX = 'index.jsonl'
+SEGMENTS = 'segments'
+
+
+def json_scalar(value):
+    # numpy scalars in run metadata, e.g. a gamma from np.linspace
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class StoredRun:
+    # One run of a ResultStore: metadata up front, arrays as read-only
+    # memory-mapped views loaded on access (None when not stored)
+    def __init__(self, store, entry):
+        self.store = store
+        self.entry = entry
+        self.meta = entry['meta']
+
+    def __getitem__(self, column):
+        if column not in self.entry['columns']:
+            return None
+        start, stop, shape = self.entry['columns'][column]
+        return self.store.column_data(self.entry['segment'], column)[start:stop].reshape(shape)
+
+    @property
+    def values(self):
+        return self['values']
+
+    @property
+    def q(self):
+        return self['q']
+
+    @property
+    def curve(self):
+        return self['curve']
+
+    @property
+    def policy(self):
+        if 'policy_actions' not in self.entry['columns']:
+            return None
+        shape = self.entry['columns'].get('values', self.entry['columns']['policy_actions'])[2]
+        return Policy(self['policy_actions'], self['policy_ties'], shape)
+
+
+class ResultStore:
+    # Value grids, Q tables, policies and convergence curves of many runs.
+    # Any number of processes may append to the same store at once; len(),
+    # runs and find() see the runs indexed so far (refresh() picks up runs
+    # appended by other processes since).
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        os.makedirs(os.path.join(self.path, SEGMENTS), exist_ok=True)
+        self.index_path = os.path.join(self.path, INDEX)
+        self.entries = []
+        self.index_offset = 0  # Bytes of the index read so far
+        self.maps = {}  # (segment, column) -> memory map
+        self.refresh()
+
+    def refresh(self):
+        # Reads index lines appended since the last refresh; a line still
+        # being written (no newline yet) is left for the next one
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'rb') as f:
+            f.seek(self.index_offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        self.entries.extend(json.loads(line) for line in data[:end].splitlines() if line.strip())
+        self.index_offset += end
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, run):
+        return StoredRun(self, self.entries[run])
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield StoredRun(self, entry)
+
+    @property
+    def runs(self):
+        # Metadata of every run, in index order
+        return [entry['meta'] for entry in self.entries]
+
+    def find(self, **criteria):
+        # Ids of the runs whose metadata matches every key=value given
+        return [run for run, entry in enumerate(self.entries)
+                if all(entry['meta'].get(key) == value for key, value in criteria.items())]
+
+    def column_data(self, segment, column):
+        key = (segment, column)
+        if key not in self.maps:
+            self.maps[key] = np.load(os.path.join(self.path, SEGMENTS, segment, column + '.npy'), mmap_mode='r')
+        return self.maps[key]
+
+    def append(self, runs):
+        # Stores runs given as dicts of arrays (any of COLUMNS) plus a 'meta'
+        # dict of JSON-able values, as one new segment; returns the new run
+        # ids as of this store's view of the index
+        runs = list(runs)
+        if not runs:
+            return []
+        segment = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:12]}"
+        entries = [{'segment': segment, 'meta': run.get('meta', {}), 'columns': {}} for run in runs]
+        parts = {}
+        for entry, run in zip(entries, runs):
+            for column in COLUMNS:
+                if run.get(column) is None:
+                    continue
+                array = np.asarray(run[column])
+                chunks = parts.setdefault(column, [])
+                start = sum(chunk.size for chunk in chunks)
+                chunks.append(array.reshape(-1))
+                entry['columns'][column] = [start, start + array.size, list(array.shape)]
+
+        tmp = os.path.join(self.path, SEGMENTS, f".tmp-{segment}")
+        os.makedirs(tmp)
+        for column, chunks in parts.items():
+            with open(os.path.join(tmp, column + '.npy'), 'wb') as f:
+                np.save(f, np.concatenate(chunks))
+                f.flush()
+                os.fsync(f.fileno())
+        os.rename(tmp, os.path.join(self.path, SEGMENTS, segment))
+
+        lines = ''.join(json.dumps(entry, default=json_scalar) + '\n' for entry in entries).encode()
+        with open(self.index_path, 'ab') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+        self.refresh()
+        return [run for run in range(len(self.entries)) if self.entries[run]['segment'] == segment]
+
+    def append_batch(self, results, **meta):
+        # Stores every problem of a batch.BatchResults; each run's metadata is
+        # its table row plus meta
+        runs = []
+        for b, row in enumerate(results.table):
+            policy = results.policies[b]
+            run_meta = dict(zip(results.table.dtype.names, row.item()))
+            run_meta.update(meta)
+            runs.append({'values': results.values[b], 'q': results.q[b], 'policy_actions': policy.actions,
+                         'policy_ties': policy.ties, 'curve': results.curves[b], 'meta': run_meta})
+        return self.append(runs)
+
+
+def as_store(store):
+    # A ResultStore or a path to open one at
+    return store if isinstance(store, ResultStore) else ResultStore(store)
@@ -0,0 +1,137 @@
+import time
+
+from gridworld.policy import Policy
+
+ARROW_OFFSETS = {
+    'U': (0, -0.5),
+    'D': (0, 0.5),
+    'L': (-0.5, 0),
+    'R': (0.5, 0)
+}
+ARROW_GLYPHS = {'U': '↑', 'D': '↓', 'L': '←', 'R': '→'}
+
+
+class GridRenderer:
+    # Draws cell colours, values and policies on a Tk canvas. Every canvas item
+    # is created once; a frame only itemconfigs the cells whose value text or
+    # policy changed, and frames are capped at max_fps regardless of how often
+    # the solver reports progress.
+    #
+    # policy_style: 'text' (label near the bottom of the cell), 'glyph' (one
+    # large arrow character) or 'arrows' (one line per action, 'D, R' allowed)
+    # profiler: an optional profiling.Profiler (e.g. engine.profiler) that
+    # times and counts the frames actually drawn
+    def __init__(self, canvas, grid_size, cell_size, max_fps=30, show_values=True, policy_style='text',
+                 profiler=None):
+        self.canvas = canvas
+        self.grid_size = grid_size
+        self.cell_size = cell_size
+        self.max_fps = max_fps
+        self.show_values = show_values
+        self.policy_style = policy_style
+        self.profiler = profiler
+
+        self.last_frame = 0.0
+        self.pending = None
+        self.redraws = 0
+
+        self.cells = {}
+        self.value_items = {}
+        self.policy_items = {}
+        self.drawn_colors = {}
+        self.drawn_values = {}
+        self.drawn_policy = {}
+        self.create_items()
+
+    def create_items(self):
+        c = self.cell_size
+        arrow_length = c * 0.4
+        for i in range(self.grid_size):
+            for j in range(self.grid_size):
+                x0 = j * c
+                y0 = i * c
+                self.cells[i, j] = self.canvas.create_rectangle(x0, y0, x0 + c, y0 + c, fill="white", outline="black")
+                if self.show_values:
+                    self.value_items[i, j] = self.canvas.create_text(x0 + c / 2, y0 + c / 2, text="", tags="values")
+
+                if self.policy_style == 'arrows':
+                    xc, yc = x0 + c / 2, y0 + c / 2
+                    self.policy_items[i, j] = {
+                        action: self.canvas.create_line(xc, yc, xc + dx * arrow_length, yc + dy * arrow_length,
+                                                        tags="policy", arrow="last", fill="black", width=2,
+                                                        state="hidden")
+                        for action, (dx, dy) in ARROW_OFFSETS.items()
+                    }
+                elif self.policy_style == 'glyph':
+                    self.policy_items[i, j] = self.canvas.create_text(x0 + c / 2, y0 + c / 2, text="", tags="policy",
+                                                                      fill="black", font=("Helvetica", 24))
+                else:
+                    self.policy_items[i, j] = self.canvas.create_text(x0 + c / 2, y0 + c - 20, text="", tags="policy",
+                                                                      fill="black")
+
+    def set_colors(self, colors, default="white"):
+        for cell, item in self.cells.items():
+            color = colors.get(cell, default)
+            if self.drawn_colors.get(cell) != color:
+                self.canvas.itemconfig(item, fill=color)
+                self.drawn_colors[cell] = color
+
+    def draw_values(self, values):
+        for cell, item in self.value_items.items():
+            text = f"{values[cell]:.2f}"
+            if self.drawn_values.get(cell) != text:
+                self.canvas.itemconfig(item, text=text)
+                self.drawn_values[cell] = text
+
+    def draw_policy(self, policy):
+        # policy: a policy.Policy, or labels indexed by cell
+        if isinstance(policy, Policy):
+            policy = policy.labels()
+        for cell, item in self.policy_items.items():
+            action = str(policy[cell]).strip()
+            if self.drawn_policy.get(cell) == action:
+                continue
+            self.drawn_policy[cell] = action
+            if self.policy_style == 'arrows':
+                shown = set(action.split(', '))
+                for a, line in item.items():
+                    self.canvas.itemconfig(line, state="normal" if a in shown else "hidden")
+            elif self.policy_style == 'glyph':
+                self.canvas.itemconfig(item, text=ARROW_GLYPHS.get(action, ' '))
+            else:
+                self.canvas.itemconfig(item, text=action)
+
+    def clear_policy(self):
+        self.draw_policy({cell: "" for cell in self.policy_items})
+
+    def render(self, values=None, policy=None, colors=None, force=False):
+        # Returns True when a frame was actually drawn. A skipped frame is kept
+        # as pending so flush() can draw the latest state.
+        now = time.perf_counter()
+        if not force and self.max_fps and now - self.last_frame < 1.0 / self.max_fps:
+            self.pending = (values, policy, colors)
+            return False
+
+        self.pending = None
+        self.last_frame = now
+        self.redraws += 1
+        if self.profiler is not None:
+            self.profiler.count('redraws')
+            with self.profiler.phase('redraw'):
+                self.draw_frame(values, policy, colors)
+        else:
+            self.draw_frame(values, policy, colors)
+        return True
+
+    def draw_frame(self, values, policy, colors):
+        if colors is not None:
+            self.set_colors(colors)
+        if values is not None and self.show_values:
+            self.draw_values(values)
+        if policy is not None:
+            self.draw_policy(policy)
+
+    def flush(self):
+        if self.pending is not None:
+            return self.render(*self.pending, force=True)
+        return False
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from gridworld import GridWorldEngine, GridWorldEnv, configurations, dp, part1_model, part2_model, solve_batch
+from gridworld.benchmark import benchmark_model
+
+
+@pytest.fixture(scope='module')
+def models():
+    # Three shapes and successor widths, two models sharing one
+    return [part2_model(), part2_model(blue_pos=(0, 2)), part1_model(), benchmark_model(8)]
+
+
+@pytest.mark.parametrize('n_workers', [None, 2])
+def test_solve_batch_equals_single_solves(models, n_workers):
+    args = configurations(models, gammas=[0.5, 0.9, 0.99], epsilons=[0.01, 0.0001])
+    results = solve_batch(*args, n_workers=n_workers)
+    assert len(results) == len(models) * 6
+    for b, row in enumerate(results.table):
+        model = models[row['model']]
+        stats = {}
+        V, q = dp.value_iteration(model, np.zeros(model.shape), row['gamma'], row['epsilon'], stats=stats)
+        np.testing.assert_array_equal(results.values[b], V)
+        np.testing.assert_allclose(results.q[b], q, rtol=1e-12, atol=1e-12)
+        assert row['sweeps'] == stats['sweeps']
+        assert row['converged']
+        assert results.curves[b].shape == (stats['sweeps'], 2)
+
+
+def test_solve_batch_policies_equal_engine_policies(models):
+    results = solve_batch(models, gammas=0.9)
+    for b, model in enumerate(models):
+        engine = GridWorldEngine(GridWorldEnv(model))
+        engine.Value_Iteration(0.9, 0.01)
+        np.testing.assert_array_equal(results.values[b], engine.values)
+        assert results.policies[b] == engine.policy
+
+
+def test_solve_batch_policy_evaluation(models):
+    probs = np.array([0.4, 0.2, 0.2, 0.2])
+    results = solve_batch(models, method='policy_evaluation', action_probs=probs, gammas=0.9)
+    for b, model in enumerate(models):
+        V = dp.policy_evaluation(model, np.zeros(model.shape), probs, 0.9)
+        np.testing.assert_array_equal(results.values[b], V)
+
+
+def test_solve_batch_max_sweeps(models):
+    results = solve_batch(models, gammas=1.0, max_sweeps=20)
+    np.testing.assert_array_equal(results.table['sweeps'], 20)
+    assert not results.table['converged'].any()
+
+
+def test_solve_batch_unknown_method(models):
+    with pytest.raises(ValueError):
+        solve_batch(models, method='q_learning')
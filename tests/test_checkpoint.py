@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+
+from gridworld import GridWorldEngine, GridWorldEnv, StoppingCriteria, SwappingGridWorldEnv, part2_model
+from gridworld.checkpoint import Checkpointer, load_checkpoint
+
+
+class Interrupt(Exception):
+    pass
+
+
+def interrupt_after(engine, event, n):
+    # Makes the engine raise on its n-th `event` notification, as if the
+    # process had been killed there
+    seen = [0]
+
+    def observer(name, _):
+        if name == event:
+            seen[0] += 1
+            if seen[0] == n:
+                raise Interrupt
+    engine.subscribe(observer)
+
+
+# (solver, environment, options, 'episode' event to interrupt at). Batched
+# Monte Carlo notifies once per batch; importance sampling saves between
+# its 256-episode batches, so it is interrupted after the first.
+MC_RUNS = [
+    ('Monte_Carlo', GridWorldEnv, {}, 170),
+    ('Monte_Carlo', SwappingGridWorldEnv, {}, 170),
+    ('Monte_Carlo', GridWorldEnv, {'batch_size': 16}, 11),
+    ('Monte_Carlo', GridWorldEnv, {'buffers': 4, 'step_size': 0.1}, 170),
+    ('Monte_Carlo_Importance_Sampling', GridWorldEnv, {}, 270),
+    ('Monte_Carlo_Importance_Sampling', GridWorldEnv, {'estimator': 'per_decision', 'batch_size': 1}, 170),
+]
+
+
+@pytest.mark.parametrize('solver, env_class, options, interrupt', MC_RUNS)
+def test_monte_carlo_resume_is_bit_exact(tmp_path, solver, env_class, options, interrupt):
+    path = os.fspath(tmp_path / 'run.npz')
+
+    def stopping():
+        return StoppingCriteria(max_episodes=300, stable_windows=50)
+
+    full = GridWorldEngine(env_class(part2_model()), seed=7)
+    getattr(full, solver)(stopping=stopping(), checkpoint=Checkpointer(os.fspath(tmp_path / 'full.npz'), seconds=None,
+                                                                     episodes=50), **options)
+
+    interrupted = GridWorldEngine(env_class(part2_model()), seed=7)
+    interrupt_after(interrupted, 'episode', interrupt)
+    with pytest.raises(Interrupt):
+        getattr(interrupted, solver)(stopping=stopping(), checkpoint=Checkpointer(path, seconds=None, episodes=50),
+                                     **options)
+    assert load_checkpoint(path)[1]['stopping']['episodes'] < 300
+
+    # A fresh engine with another seed: everything comes from the checkpoint
+    resumed = GridWorldEngine(env_class(part2_model()), seed=123)
+    resumed.resume(path)
+    np.testing.assert_array_equal(resumed.Q, full.Q)
+    np.testing.assert_array_equal(resumed.values, full.values)
+    assert resumed.policy == full.policy
+    assert resumed.episodes_run == full.episodes_run
+    assert resumed.stop_reason == full.stop_reason
+
+
+def test_value_iteration_resume_is_bit_exact(tmp_path):
+    path = os.fspath(tmp_path / 'vi.npz')
+    full = GridWorldEngine(GridWorldEnv(part2_model()))
+    full.Value_Iteration(0.99, 1e-8, checkpoint=Checkpointer(os.fspath(tmp_path / 'full.npz'), seconds=None))
+
+    interrupted = GridWorldEngine(GridWorldEnv(part2_model()))
+    interrupt_after(interrupted, 'sweep', 300)
+    with pytest.raises(Interrupt):
+        interrupted.Value_Iteration(0.99, 1e-8, checkpoint=Checkpointer(path, seconds=None, episodes=50))
+    assert load_checkpoint(path)[1]['solver'] == 'Value_Iteration'
+
+    resumed = GridWorldEngine(GridWorldEnv(part2_model()))
+    resumed.resume(path)
+    np.testing.assert_array_equal(resumed.values, full.values)
+    assert resumed.solve_sweeps == full.solve_sweeps
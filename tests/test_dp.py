@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+from gridworld import GridModel, dp, parse_layout, part1_model, part2_model
+from gridworld.benchmark import benchmark_model
+
+GAMMA = 0.9
+SCHEDULES = ['sync', 'gauss_seidel', 'prioritized']
+
+WALLED = """
+step_reward -0.1
+terminal_reward 1
+map
+. A . . .
+. # # . T
+. . . # .
+B # . . .
+. . . . T
+end
+teleport A 3 B
+teleport B 0.5 0,3:0.5 4,2:0.5
+"""
+
+
+def walled_model():
+    return parse_layout(WALLED)
+
+
+MODELS = [part1_model, part2_model, walled_model]
+
+
+def dense_policy_values(model, pi, gamma=GAMMA):
+    # Solves (I - gamma P_pi) V = R_pi on the dense transition tensor
+    P_pi = np.einsum('sa,sat->st', pi, model.P)
+    return np.linalg.solve(np.eye(model.n_states) - gamma * P_pi, (pi * model.R).sum(axis=1))
+
+
+def optimal_values(model, gamma=GAMMA):
+    # Value iteration on the dense tensor until the values stop changing,
+    # then an exact solve of the greedy policy
+    V = np.zeros(model.n_states)
+    for _ in range(2000):
+        V = (model.R + gamma * model.P @ V).max(axis=1)
+    actions = np.argmax(model.R + gamma * model.P @ V, axis=1)
+    return dense_policy_values(model, np.eye(model.n_actions)[actions], gamma)
+
+
+@pytest.mark.parametrize('builder', MODELS)
+@pytest.mark.parametrize('schedule', SCHEDULES)
+def test_value_iteration_schedules(builder, schedule):
+    model = builder()
+    stats = {}
+    V, q = dp.value_iteration(model, np.zeros(model.shape), GAMMA, 1e-10, schedule=schedule, stats=stats)
+    np.testing.assert_allclose(V.ravel(), optimal_values(model), atol=1e-8)
+    np.testing.assert_allclose(q, dp.q_values(model, V, GAMMA), atol=1e-12)
+    assert stats['backups'] > 0
+
+
+@pytest.mark.parametrize('builder', MODELS)
+@pytest.mark.parametrize('schedule', SCHEDULES)
+def test_policy_evaluation_schedules(builder, schedule):
+    model = builder()
+    probs = np.array([0.1, 0.2, 0.3, 0.4])
+    V = dp.policy_evaluation(model, np.zeros(model.shape), probs, GAMMA, 1e-10, schedule=schedule)
+    np.testing.assert_allclose(V.ravel(), dense_policy_values(model, np.broadcast_to(probs, model.R.shape)),
+                               atol=1e-8)
+
+
+def test_unknown_schedule():
+    with pytest.raises(ValueError):
+        dp.value_iteration(part1_model(), np.zeros((5, 5)), schedule='random')
+
+
+@pytest.mark.parametrize('builder', MODELS)
+@pytest.mark.parametrize('solver', ['dense', 'sparse'])
+def test_policy_iteration(builder, solver):
+    if solver == 'sparse':
+        pytest.importorskip('scipy')
+    model = builder()
+    V, q, actions, rounds = dp.policy_iteration(model, np.zeros(model.shape), GAMMA, solver)
+    expected = optimal_values(model)
+    np.testing.assert_allclose(V.ravel(), expected, atol=1e-8)
+    # The greedy actions are optimal: evaluating them gives the optimal values
+    np.testing.assert_allclose(dense_policy_values(model, np.eye(model.n_actions)[actions]), expected, atol=1e-8)
+    assert rounds < 20
+
+
+@pytest.mark.parametrize('builder', MODELS)
+@pytest.mark.parametrize('k', [0, 5, 'adaptive'])
+def test_modified_policy_iteration(builder, k):
+    model = builder()
+    stats = {}
+    V, q, actions = dp.modified_policy_iteration(model, np.zeros(model.shape), GAMMA, 1e-10, k=k, stats=stats)
+    np.testing.assert_allclose(V.ravel(), optimal_values(model), atol=1e-8)
+    assert stats['improvements'] == len(stats['residuals'])
+
+
+@pytest.mark.parametrize('builder', MODELS)
+def test_exact_policy_evaluation_sparse_equals_dense(builder):
+    pytest.importorskip('scipy')
+    model = builder()
+    rng = np.random.default_rng(0)
+    pi = rng.random(model.R.shape)
+    pi /= pi.sum(axis=1, keepdims=True)
+    expected = dense_policy_values(model, pi, 0.99)
+    for solver in ('dense', 'sparse'):
+        V = dp.exact_policy_evaluation(model, pi, 0.99, solver)
+        np.testing.assert_allclose(V, expected, rtol=1e-7, atol=1e-7)
+
+
+def test_exact_policy_evaluation_auto_goes_sparse_on_large_grids():
+    pytest.importorskip('scipy')
+    model = benchmark_model(50)
+    assert model.n_states > dp.DENSE_LIMIT
+    actions = np.random.default_rng(1).integers(model.n_actions, size=model.n_states)
+    V = dp.exact_policy_evaluation(model, actions, 0.95, 'auto')
+    # V is the fixed point of the policy's Bellman backup
+    pi = dp.policy_probs(model, actions)
+    np.testing.assert_allclose(dp.backup(model, V, 0.95, pi=pi), V, atol=1e-7)
+
+
+def test_prioritized_sweeping_saves_backups_on_sparse_rewards():
+    # One rewarding terminal in a 50x50 open grid: only the states whose
+    # values change get backed up again
+    model = GridModel((50, 50), terminals=[(49, 49)], terminal_reward=1.0, step_reward=0.0, wall_reward=0.0)
+    backups = {}
+    values = {}
+    for schedule in SCHEDULES:
+        stats = {}
+        values[schedule], _ = dp.value_iteration(model, np.zeros(model.shape), 0.95, 1e-6, schedule=schedule,
+                                                 stats=stats)
+        backups[schedule] = stats['backups']
+    assert backups['prioritized'] < 0.1 * backups['sync']
+    assert backups['gauss_seidel'] < backups['sync']
+    np.testing.assert_allclose(values['prioritized'], values['sync'], atol=1e-4)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from gridworld import GridWorldEngine, GridWorldEnv, SwappingGridWorldEnv, part2_model
+
+RUNS = [
+    (GridWorldEnv, 'Monte_Carlo', {'n_episodes': 150}),
+    (GridWorldEnv, 'Monte_Carlo', {'n_episodes': 150, 'batch_size': 8}),
+    (SwappingGridWorldEnv, 'Monte_Carlo', {'n_episodes': 150, 'exploring_starts': False, 'step_size': 0.05}),
+    (GridWorldEnv, 'Monte_Carlo_Importance_Sampling', {'n_episodes': 300, 'batch_size': 1}),
+    (GridWorldEnv, 'Monte_Carlo_Importance_Sampling', {'n_episodes': 300, 'estimator': 'ordinary'}),
+]
+
+
+@pytest.mark.parametrize('env_class, solver, options', RUNS)
+def test_run_seed_replays_on_the_same_engine(env_class, solver, options):
+    engine = GridWorldEngine(env_class(part2_model()), seed=5)
+    getattr(engine, solver)(**options)
+    seed, Q, policy, teleports = engine.run_seed, engine.Q.copy(), engine.policy, dict(engine.model.teleports)
+
+    # Another run in between leaves its policies (and layout) behind
+    getattr(engine, solver)(**options)
+    getattr(engine, solver)(seed=seed, **options)
+    np.testing.assert_array_equal(engine.Q, Q)
+    assert engine.policy == policy
+    assert engine.model.teleports == teleports
+    assert engine.run_seed == seed
+
+    fresh = GridWorldEngine(env_class(part2_model()), seed=99)
+    getattr(fresh, solver)(seed=seed, **options)
+    np.testing.assert_array_equal(fresh.Q, Q)
+
+
+def test_swapping_env_reset_layout():
+    env = SwappingGridWorldEnv(part2_model(), swap_prob=1.0, rng=np.random.default_rng(0))
+    teleports = dict(env.model.teleports)
+    env.maybe_swap()
+    assert env.model.teleports != teleports
+    env.reset_layout()
+    assert env.model.teleports == teleports
+    np.testing.assert_array_equal(env.model.next_states, part2_model().next_states)
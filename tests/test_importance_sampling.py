@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from gridworld import mc
+
+S, A, GAMMA = 12, 4, 0.9
+
+
+def incremental_q(episodes, estimator, target_probs, behavior_probs, gamma=GAMMA):
+    # The textbook step-by-step updates, walking each episode backwards:
+    # weighted C += W, Q += W / C (G - Q); ordinary and per-decision keep a
+    # running mean of W G and of the per-decision return
+    Q, C, N = np.zeros((S, A)), np.zeros((S, A)), np.zeros((S, A))
+    for states, actions, rewards in episodes:
+        G, W, next_ratio = 0.0, 1.0, 1.0
+        for t in range(len(states) - 1, -1, -1):
+            s, a = states[t], actions[t]
+            ratio = target_probs[s, a] / behavior_probs[a]
+            if estimator == 'per_decision':
+                G = rewards[t] + gamma * next_ratio * G
+                next_ratio = ratio
+                N[s, a] += 1
+                Q[s, a] += (G - Q[s, a]) / N[s, a]
+                continue
+            G = gamma * G + rewards[t]
+            if estimator == 'weighted':
+                if W == 0:
+                    break
+                C[s, a] += W
+                Q[s, a] += W / C[s, a] * (G - Q[s, a])
+            else:
+                N[s, a] += 1
+                Q[s, a] += (W * G - Q[s, a]) / N[s, a]
+            W *= ratio
+    return Q
+
+
+@pytest.fixture
+def problem():
+    # A target policy with some zero probabilities, so episodes get cut off
+    rng = np.random.default_rng(0)
+    target = rng.random((S, A))
+    target[rng.random((S, A)) < 0.25] = 0.0
+    target[target.sum(axis=1) == 0, 0] = 1.0
+    target /= target.sum(axis=1, keepdims=True)
+    behavior = np.full(A, 1.0 / A)
+    episodes = [(rng.integers(S, size=n), rng.integers(A, size=n), rng.normal(size=n))
+                for n in rng.integers(1, 40, size=200)]
+    return target, behavior, episodes
+
+
+@pytest.mark.parametrize('estimator', mc.IS_ESTIMATORS)
+def test_importance_sampling_update_equals_incremental_loop(problem, estimator):
+    target, behavior, episodes = problem
+    Q, weight, N = np.zeros((S, A)), np.zeros((S, A)), np.zeros((S, A), dtype=np.int64)
+    for episode in episodes:
+        mc.importance_sampling_update(Q, weight, N, episode, GAMMA, target, behavior, estimator)
+    np.testing.assert_allclose(Q, incremental_q(episodes, estimator, target, behavior), rtol=1e-10, atol=1e-12)
+
+
+def test_importance_sampling_update_unknown_estimator(problem):
+    target, behavior, episodes = problem
+    with pytest.raises(ValueError):
+        mc.importance_sampling_update(np.zeros((S, A)), np.zeros((S, A)), np.zeros((S, A), dtype=np.int64),
+                                      episodes[0], GAMMA, target, behavior, 'doubly_robust')
+
+
+@pytest.mark.parametrize('T', [0, 1, 2, 5, 64, 1000])
+def test_per_decision_returns_equal_recursion(T):
+    rng = np.random.default_rng(T)
+    rewards = rng.normal(size=T)
+    ratios = rng.random(T) * 2
+    ratios[rng.random(T) < 0.05] = 0.0
+    expected, G = np.zeros(T), 0.0
+    for t in range(T - 1, -1, -1):
+        G = rewards[t] + (GAMMA * ratios[t + 1] * G if t + 1 < T else 0.0)
+        expected[t] = G
+    np.testing.assert_allclose(mc.per_decision_returns(rewards, ratios, GAMMA), expected, rtol=1e-10, atol=1e-12)
+
+
+def test_importance_weights_cut_at_last_zero_ratio():
+    states = np.zeros(5, dtype=np.int64)
+    actions = np.array([0, 1, 0, 1, 0])
+    target = np.array([[0.5, 0.0, 0.5, 0.0]])
+    first, W, ratios = mc.importance_weights(states, actions, target, np.full(4, 0.25))
+    assert first == 3
+    np.testing.assert_array_equal(ratios, [2.0, 0.0, 2.0, 0.0, 2.0])
+    np.testing.assert_array_equal(W, [2.0, 1.0])
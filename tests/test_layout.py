@@ -0,0 +1,59 @@
+import os
+import re
+
+import numpy as np
+import pytest
+
+from gridworld import load_layout, parse_layout, part1_model, part2_model
+
+LAYOUTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'layouts')
+
+
+def transitions(model):
+    # Dense (S, A, S) transition probabilities, whatever the successor width
+    S, A, _ = model.next_states.shape
+    P = np.zeros((S, A, S))
+    s, a = np.indices((S, A))
+    for k in range(model.next_states.shape[2]):
+        np.add.at(P, (s, a, model.next_states[:, :, k]), model.next_probs[:, :, k])
+    return P
+
+
+@pytest.mark.parametrize('name, builder', [('part1.txt', part1_model), ('part2.txt', part2_model)])
+def test_layout_files_equal_built_in_models(name, builder):
+    loaded, built = load_layout(os.path.join(LAYOUTS, name)), builder()
+    assert loaded.shape == built.shape
+    np.testing.assert_array_equal(transitions(loaded), transitions(built))
+    np.testing.assert_array_equal(loaded.R, built.R)
+    np.testing.assert_array_equal(loaded.is_terminal, built.is_terminal)
+    np.testing.assert_array_equal(loaded.start_states, built.start_states)
+    assert loaded.teleports == built.teleports
+
+
+def test_labels_and_coordinates():
+    model = parse_layout("size 3 4\nwall 1,1\nterminal 2,3\nstart 0,2\nmap\n.A..\n.#..\n...T\nend\n"
+                         "teleport A 2 2,0\n")
+    assert model.is_wall.reshape(3, 4)[1, 1]
+    assert model.is_terminal.reshape(3, 4)[2, 3]
+    np.testing.assert_array_equal(model.start_states, [2])
+    np.testing.assert_array_equal(model.labels['A'], [1])
+    assert model.teleports == {(0, 1): ([((2, 0), 1.0)], 2.0)}
+
+
+@pytest.mark.parametrize('text, message', [
+    ("size 3 3\nwall 3,0\n", "line 2: wall cell (3, 0) is outside the (3, 3) grid"),
+    ("size 3 3\nstart 0,-1\n", "line 2: start cell (0, -1) is outside"),
+    ("size 3 3\nterminal 1,9\n", "line 2: terminal cell (1, 9) is outside"),
+    ("size 3 3\nteleport 0,0 1 5,5\n", "line 2: teleport target cell (5, 5) is outside"),
+    ("size 3 3\nteleport 4,0 1 1,1\n", "line 2: teleport cell (4, 0) is outside"),
+    ("size 3 3\nwall 1,1\nteleport 0,0 1 1,1\n", "line 3: teleport target (1, 1) is a wall"),
+    ("map\nA#\n..\nend\nteleport A 1 0,1\n", "line 5: teleport target (0, 1) is a wall"),
+    ("map\nAB\nB.\nend\nteleport A 1 B\n", "line 5: target 'B' must label exactly one cell"),
+    ("size 3 3\nteleport 0,0 1 1,1:0.5 2,2:0.4\n", "target probabilities sum to"),
+    ("map\nG.R\n..Y\nend\nteleport G 2.5 R:-0.5 Y:1.5\n", "line 5: target probability -0.5 is not between 0 and 1"),
+    ("map\n..\n..\n", "line 1: map without 'end'"),
+    ("size 2 2\nportal 0,0\n", "line 2: unknown directive 'portal'"),
+])
+def test_invalid_layouts(text, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        parse_layout(text)
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from gridworld import GridModel, dp, part1_model, part2_model
+
+BLUE, GREEN = (0, 1), (0, 4)
+
+
+def transitions(model):
+    # Dense (S, A, S) transition probabilities, whatever the successor width
+    S, A, _ = model.next_states.shape
+    P = np.zeros((S, A, S))
+    s, a = np.indices((S, A))
+    for k in range(model.next_states.shape[2]):
+        np.add.at(P, (s, a, model.next_states[:, :, k]), model.next_probs[:, :, k])
+    return P
+
+
+def assert_same_model(model, expected):
+    np.testing.assert_array_equal(transitions(model), transitions(expected))
+    np.testing.assert_array_equal(model.R, expected.R)
+    np.testing.assert_array_equal(model.is_terminal, expected.is_terminal)
+    assert model.teleports == expected.teleports
+
+
+def walled_model(terminals=((2, 4), (4, 0)), teleports=None):
+    teleports = {BLUE: ([((3, 2), 1.0)], 5.0), GREEN: ([((4, 2), 0.5), ((4, 4), 0.5)], 2.5)} \
+        if teleports is None else teleports
+    return GridModel((5, 6), teleports, step_reward=-0.2, terminals=terminals, terminal_reward=1.0,
+                     walls=[(1, 1), (1, 2), (3, 4)])
+
+
+def test_apply_delta_swap():
+    model = part2_model()
+    changed = model.apply_delta(swap=(BLUE, GREEN))
+    np.testing.assert_array_equal(changed, [1, 4])
+    assert_same_model(model, part2_model(blue_pos=GREEN, green_pos=BLUE))
+
+
+@pytest.mark.parametrize('terminals', [{(1, 3): True}, {(2, 4): False}, {(2, 4): False, (0, 0): True}])
+def test_apply_delta_terminals(terminals):
+    model = walled_model()
+    model.apply_delta(terminals=terminals)
+    cells = {(2, 4), (4, 0)}
+    cells |= {cell for cell, terminal in terminals.items() if terminal}
+    cells -= {cell for cell, terminal in terminals.items() if not terminal}
+    # Neighbours of a toggled terminal get their entering reward updated too
+    assert_same_model(model, walled_model(terminals=sorted(cells)))
+
+
+def test_apply_delta_teleports_grow_and_shrink():
+    model = walled_model()
+    assert model.next_states.shape[2] == 2
+    wide = ([((4, 2), 0.25), ((4, 5), 0.25), ((2, 0), 0.5)], -1.0)
+    changed = model.apply_delta(teleports={(2, 2): wide, BLUE: None})
+    assert model.next_states.shape[2] == 3
+    assert changed.size == model.n_states
+    expected = {GREEN: walled_model().teleports[GREEN], (2, 2): wide}
+    assert_same_model(model, walled_model(teleports=expected))
+
+    model.apply_delta(teleports={(2, 2): None, (4, 1): ([((0, 0), 1.0)], 0.5)})
+    expected = {GREEN: expected[GREEN], (4, 1): ([((0, 0), 1.0)], 0.5)}
+    assert_same_model(model, walled_model(teleports=expected))
+
+
+@pytest.mark.parametrize('delta', [{'swap': (BLUE, GREEN)}, {'terminals': {(1, 3): True}},
+                                   {'teleports': {(3, 0): ([((0, 5), 1.0)], 3.0)}}])
+def test_predecessors_cover_every_transition(delta):
+    model = walled_model()
+    model.apply_delta(**delta)
+    indptr, preds = dp.predecessors(model)
+    for s in range(model.n_states):
+        assert set(preds[indptr[s]:indptr[s + 1]].tolist()) <= set(model.predecessors([s]).tolist())
+
+
+@pytest.mark.parametrize('builder, delta', [
+    (part2_model, {'swap': (BLUE, GREEN)}),
+    (part1_model, {'teleports': {(2, 2): ([((0, 0), 0.2), ((4, 0), 0.3), ((0, 3), 0.5)], 1.0)}}),
+    (walled_model, {'terminals': {(2, 4): False, (1, 3): True}}),
+])
+@pytest.mark.parametrize('action_probs', [None, np.full(4, 0.25)])
+def test_resolve_equals_full_solve(builder, delta, action_probs):
+    gamma, epsilon = 0.9, 1e-10
+    model = builder()
+    values = np.zeros(model.shape)
+    if action_probs is None:
+        values, _ = dp.value_iteration(model, values, gamma, epsilon)
+    else:
+        values = dp.policy_evaluation(model, values, action_probs, gamma, epsilon)
+
+    changed = model.apply_delta(**delta)
+    stats = {}
+    V, q = dp.resolve(model, values, changed, gamma, epsilon, action_probs=action_probs, stats=stats)
+
+    fresh = builder()
+    fresh.apply_delta(**delta)
+    fresh.build()  # From scratch, not incrementally
+    if action_probs is None:
+        expected, expected_q = dp.value_iteration(fresh, np.zeros(fresh.shape), gamma, epsilon)
+    else:
+        expected = dp.policy_evaluation(fresh, np.zeros(fresh.shape), action_probs, gamma, epsilon)
+        expected_q = dp.q_values(fresh, expected, gamma)
+    np.testing.assert_allclose(V, expected, atol=1e-8)
+    np.testing.assert_allclose(q, expected_q, atol=1e-8)
+    assert stats['sweeps'] > 0
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from gridworld import mc
+
+SCHEDULES = [mc.SampleAverage(), mc.ConstantStepSize(0.1), mc.PolynomialStepSize(0.7)]
+
+
+def sequential(Q, N, returns, step_size):
+    # One update per return, alpha_k for the k-th visit
+    for G in returns:
+        N += 1
+        Q += float(step_size.rate(np.array([N]))[0]) * (G - Q)
+    return Q, N
+
+
+@pytest.mark.parametrize('step_size', SCHEDULES, ids=lambda s: type(s).__name__)
+def test_batch_rate_equals_product_of_rates(step_size):
+    N = np.array([0, 0, 3, 10, 250])
+    n = np.array([1, 5, 1, 7, 40])
+    expected = [1.0 - np.prod([1.0 - step_size.rate(np.array([k]))[0] for k in range(N0 + 1, N0 + n0 + 1)])
+                for N0, n0 in zip(N.tolist(), n.tolist())]
+    np.testing.assert_allclose(step_size.batch_rate(N, n), expected, rtol=1e-12)
+    # The generic reduction agrees with the closed forms of the subclasses
+    np.testing.assert_allclose(mc.StepSize.batch_rate(step_size, N, n), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('step_size', SCHEDULES, ids=lambda s: type(s).__name__)
+def test_update_q_equals_sequential_updates_of_equal_returns(step_size):
+    Q, N = np.array([[0.0, 2.0]]), np.array([[0, 4]], dtype=np.int64)
+    keys = np.array([0, 1, 1, 0, 1])
+    returns = np.where(keys == 0, -1.5, 3.0)
+    mc.update_q(Q, N, keys, returns, step_size)
+
+    for key, start_q, start_n in [(0, 0.0, 0), (1, 2.0, 4)]:
+        q, n = sequential(start_q, start_n, returns[keys == key], step_size)
+        assert Q.reshape(-1)[key] == pytest.approx(q, rel=1e-12)
+        assert N.reshape(-1)[key] == n
+
+
+def test_sample_average_batch_is_the_running_mean():
+    rng = np.random.default_rng(0)
+    Q, N = np.zeros((3, 2)), np.zeros((3, 2), dtype=np.int64)
+    seen = [[] for _ in range(6)]
+    for _ in range(20):
+        keys, returns = rng.integers(6, size=8), rng.normal(size=8)
+        mc.update_q(Q, N, keys, returns, mc.SampleAverage())
+        for key, G in zip(keys.tolist(), returns):
+            seen[key].append(G)
+    np.testing.assert_allclose(Q.reshape(-1), [np.mean(g) if g else 0.0 for g in seen], rtol=1e-12, atol=1e-14)
+    np.testing.assert_array_equal(N.reshape(-1), [len(g) for g in seen])
+
+
+@pytest.mark.parametrize('spec', [None, 'sample_average', 0.05, 'polynomial', ('polynomial', 0.8)])
+def test_step_size_spec_round_trip(spec):
+    step_size = mc.as_step_size(spec)
+    again = mc.as_step_size(mc.step_size_spec(step_size))
+    assert type(again) is type(step_size) and vars(again) == vars(step_size)
+
+
+def test_unknown_step_size():
+    with pytest.raises(ValueError):
+        mc.as_step_size('harmonic')
@@ -0,0 +1,78 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+from gridworld import GridWorldEngine, GridWorldEnv, ResultStore, part2_model, solve_batch
+
+
+def run_arrays(worker, k):
+    # Deterministic arrays of run k of a worker, so readers can check them
+    rng = np.random.default_rng(1000 * worker + k)
+    return {'values': rng.normal(size=(5, 5)), 'q': rng.normal(size=(25, 4)), 'curve': rng.random((k + 1, 2)),
+            'meta': {'worker': worker, 'k': k}}
+
+
+def append_runs(path, worker, n_appends=4, per_append=3):
+    store = ResultStore(path)
+    for a in range(n_appends):
+        store.append(run_arrays(worker, a * per_append + k) for k in range(per_append))
+    return worker
+
+
+def test_round_trip(tmp_path):
+    store = ResultStore(tmp_path)
+    engine = GridWorldEngine(GridWorldEnv(part2_model()))
+    engine.Value_Iteration(0.9, 0.001)
+    run = store[engine.save_results(store, layout='part2')]
+    np.testing.assert_array_equal(run.values, engine.values)
+    np.testing.assert_array_equal(run.q, engine.Q)
+    assert run.policy == engine.policy
+    assert run.meta['layout'] == 'part2'
+
+    reopened = ResultStore(tmp_path)
+    assert len(reopened) == 1
+    assert reopened[0].policy == engine.policy
+    np.testing.assert_array_equal(reopened[0].curve, run.curve)
+
+
+def test_append_batch(tmp_path):
+    results = solve_batch([part2_model(), part2_model(blue_pos=(0, 2))], gammas=np.float64(0.9))
+    store = ResultStore(tmp_path)
+    ids = store.append_batch(results, sweep='blue')
+    assert ids == [0, 1]
+    assert store.find(model=1, sweep='blue') == [1]
+    for b in ids:
+        np.testing.assert_array_equal(store[b].values, results.values[b])
+        assert store[b].policy == results.policies[b]
+        assert store[b].meta['sweeps'] == results.table['sweeps'][b]
+
+
+def test_concurrent_appends(tmp_path):
+    path = os.fspath(tmp_path)
+    n_workers = 6
+    with ProcessPoolExecutor(n_workers) as executor:
+        assert sorted(executor.map(append_runs, [path] * n_workers, range(n_workers))) == list(range(n_workers))
+
+    store = ResultStore(path)
+    assert len(store) == n_workers * 12
+    assert not [name for name in os.listdir(os.path.join(path, 'segments')) if name.startswith('.tmp')]
+    seen = set()
+    for run in store:
+        expected = run_arrays(run.meta['worker'], run.meta['k'])
+        for column in ('values', 'q', 'curve'):
+            np.testing.assert_array_equal(run[column], expected[column])
+        assert run.policy is None
+        seen.add((run.meta['worker'], run.meta['k']))
+    assert len(seen) == n_workers * 12
+
+
+def test_refresh_skips_partial_line(tmp_path):
+    store = ResultStore(tmp_path)
+    reader = ResultStore(tmp_path)
+    store.append([run_arrays(0, 0)])
+    with open(os.path.join(tmp_path, 'index.jsonl'), 'ab') as f:
+        f.write(b'{"segment": "still-being-wr')
+    reader.refresh()
+    assert len(reader) == 1
+    assert reader.runs == [{'worker': 0, 'k': 0}]
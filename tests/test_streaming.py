@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from gridworld import GridWorldEnv, part2_model
+from gridworld import mc
+from gridworld.env import BufferPool
+
+
+def reference_sums(states, actions, rewards, gamma, n_actions, visit):
+    # Per (state, action) sums and counts of the returns, from the
+    # step-by-step recursion G[t] = r[t] + gamma * G[t + 1] over the whole
+    # episode
+    G, returns = 0.0, np.zeros(len(rewards))
+    for t in range(len(rewards) - 1, -1, -1):
+        G = rewards[t] + gamma * G
+        returns[t] = G
+    sums, counts, seen = {}, {}, set()
+    for s, a, g in zip(states.tolist(), actions.tolist(), returns):
+        key = s * n_actions + a
+        if visit == 'first' and key in seen:
+            continue
+        seen.add(key)
+        sums[key] = sums.get(key, 0.0) + g
+        counts[key] = counts.get(key, 0) + 1
+    keys = np.array(sorted(sums), dtype=np.int64)
+    return keys, np.array([sums[k] for k in keys.tolist()]), np.array([counts[k] for k in keys.tolist()])
+
+
+@pytest.mark.parametrize('visit', ['first', 'every'])
+@pytest.mark.parametrize('chunk', [1, 7, 64, 1000])
+def test_streaming_returns_equal_full_episode_returns(visit, chunk):
+    rng = np.random.default_rng(3)
+    S, A, gamma = 6, 4, 0.9
+    streaming = mc.StreamingReturns(A, gamma, visit)
+    for T in (1, 50, 333):
+        states, actions, rewards = rng.integers(S, size=T), rng.integers(A, size=T), rng.normal(size=T)
+        for start in range(0, T, chunk):
+            streaming.add(states[start:start + chunk], actions[start:start + chunk], rewards[start:start + chunk])
+        keys, sums, counts = streaming.finish()
+
+        ref_keys, ref_sums, ref_counts = reference_sums(states, actions, rewards, gamma, A, visit)
+        np.testing.assert_array_equal(keys, ref_keys)
+        np.testing.assert_array_equal(counts, ref_counts)
+        np.testing.assert_allclose(sums, ref_sums, rtol=1e-12, atol=1e-12)
+
+
+def test_streaming_returns_match_batch_visits():
+    rng = np.random.default_rng(4)
+    states, actions, rewards = rng.integers(10, size=500), rng.integers(4, size=500), rng.normal(size=500)
+    for visit in ('first', 'every'):
+        streaming = mc.StreamingReturns(4, 0.95, visit)
+        for start in range(0, 500, 37):
+            streaming.add(states[start:start + 37], actions[start:start + 37], rewards[start:start + 37])
+        keys, sums, counts = streaming.finish()
+
+        batch_keys, returns = mc.batch_visits([(states, actions, rewards)], 0.95, 4, visit)
+        ref_keys, inverse = np.unique(batch_keys, return_inverse=True)
+        np.testing.assert_array_equal(keys, ref_keys)
+        np.testing.assert_array_equal(counts, np.bincount(inverse))
+        np.testing.assert_allclose(sums, np.bincount(inverse, returns), rtol=1e-12, atol=1e-12)
+
+
+def test_unknown_visit_mode():
+    with pytest.raises(ValueError):
+        mc.StreamingReturns(4, 0.9, 'last')
+
+
+def test_stream_episode_matches_generate_episode():
+    # Same seed, same draws: the buffered chunks concatenate to the episode
+    # generate_episode returns, and every buffer goes back to the pool
+    probs = np.full(4, 0.25)
+    model = part2_model()
+    full = GridWorldEnv(model, rng=np.random.default_rng(11)).generate_episode(probs, 0)
+
+    env = GridWorldEnv(model, rng=np.random.default_rng(11))
+    pool = BufferPool(n_buffers=2, capacity=8)
+    chunks = []
+    for buffer in env.stream_episode(probs, 0, pool):
+        chunks.append([array.copy() for array in buffer.steps()])
+        final = buffer.final
+        pool.release(buffer)
+    assert final
+    assert len(pool.free) == 2
+    for streamed, expected in zip(zip(*chunks), full):
+        np.testing.assert_array_equal(np.concatenate(streamed), expected)
+
+
+def test_stream_episode_max_steps_releases_buffer():
+    env = GridWorldEnv(part2_model(), rng=np.random.default_rng(0), max_steps=20)
+    pool = BufferPool(n_buffers=1, capacity=64)
+    with pytest.raises(RuntimeError):
+        for buffer in env.stream_episode(np.array([1.0, 0.0, 0.0, 0.0]), 0, pool):
+            pool.release(buffer)
+    assert len(pool.free) == 1